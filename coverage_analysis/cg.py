@@ -1,16 +1,28 @@
 """
-This script is used to generate a call graph with regex upto 2 level for 
-the pdf_bake_document function. It is run from the root of the mupdf repo.
+This script is used to generate a call graph with regex upto --depth levels
+(2 by default) for the pdf_bake_document function (or any --entry). It is run
+from the root of the mupdf repo.
 """
 
 #!/usr/bin/env python3
 import os
 import re 
 import sys
+import json
+import mmap
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
 
 SRC_ROOT = "source"
 HDR_ROOT = "include/mupdf"
+ENTRY = "pdf_bake_document"
 OUT_FILE = "bake_funky.txt"
+DOT_FILE = "cg.dot"
+INDEX_FILE = ".cg_index.json"
+INDEX_VERSION = 2
+SNAPSHOT_VERSION = 1
 
 IGNORE_TOKENS = {
     "if",
@@ -28,62 +40,218 @@ IGNORE_TOKENS = {
     "fz_try",
 }
 MACRO_RE = re.compile(r"^[A-Z][A-Z0-9_]*$")
+DEF_RE = re.compile(rb"\b([A-Za-z_]\w*)\s*\(([^)]*)\)\s*\{")
+NOISE_RE = re.compile(
+    rb'/\*.*?\*/|//[^\n]*|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'', re.DOTALL
+)
+BRACE_RE = re.compile(rb"[{}]")
 
-def get_signature(func_name, code):
-    """
-    From the file contents `code`, find the *definition* of `func_name`
-    (i.e. the line ending in ') {'), capture only its argument list,
-    and return a string like 'func_name(arg1, arg2, …)'.
-    """
-    sig_re = re.compile(
-        rf'\b{re.escape(func_name)}\s*\(\s*([^)]*?)\s*\)\s*\{{',
-        re.DOTALL
+
+def parse_args():
+    p = argparse.ArgumentParser(
+        description="Regex call graph of a mupdf function (run from the mupdf root)."
     )
-    m = sig_re.search(code or "")
-    if m:
-        args = m.group(1).strip()
-        return f"{func_name}({args})"
-    return f"{func_name}("
+    p.add_argument("--entry", default=ENTRY, help=f"root function (default: {ENTRY})")
+    p.add_argument(
+        "--depth", type=int, default=2, help="levels of calls below the entry (default: 2)"
+    )
+    p.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=0,
+        help="processes used to tokenize function bodies (default: one per CPU)",
+    )
+    p.add_argument("--out", default=OUT_FILE, help=f"function list for covmeta.py (default: {OUT_FILE})")
+    p.add_argument("--dot", default=DOT_FILE, help=f"Graphviz output (default: {DOT_FILE})")
+    p.add_argument(
+        "--cache",
+        default=INDEX_FILE,
+        help=f"definition index cache file (default: {INDEX_FILE})",
+    )
+    p.add_argument(
+        "--no-cache", action="store_true", help="rebuild the definition index from scratch"
+    )
+    p.add_argument("--snapshot", help="write a graph snapshot (JSON) for later --previous runs")
+    p.add_argument(
+        "--previous",
+        help="graph snapshot of an earlier run: only functions whose bodies live in "
+        "changed files are re-tokenized, and the changes to the graph are reported",
+    )
+    p.add_argument(
+        "--changed-since",
+        metavar="REV",
+        help="with --previous, take the changed files from `git diff --name-only REV` "
+        "instead of comparing sizes and mtimes against the snapshot",
+    )
+    args = p.parse_args()
+    if args.changed_since and not args.previous:
+        p.error("--changed-since requires --previous")
+    return args
 
-def load_file_codes():
-    """Return a dict mapping each .c/.h path under SRC_ROOT to its file contents."""
-    files = {}
+
+def list_source_files():
+    """Return the .c/.h paths under SRC_ROOT and the .h paths under HDR_ROOT, in walk order."""
+    paths = []
     for root, _, names in os.walk(SRC_ROOT):
         for fn in names:
             if fn.endswith((".c", ".h")):
-                path = os.path.join(root, fn)
-                try:
-                    files[path] = open(path, "r", errors="ignore").read()
-                except IOError:
-                    pass
+                paths.append(os.path.join(root, fn))
     for root, _, names in os.walk(HDR_ROOT):
         for fn in names:
             if fn.endswith(".h"):
-                path = os.path.join(root, fn)
-                try:
-                    files[path] = open(path, "r", errors="ignore").read()
-                except IOError:
-                    pass
-    return files
+                paths.append(os.path.join(root, fn))
+    return paths
 
 
-def extract_body(code, func_name):
-    """Extract the entire definition of func_name, including its braces."""
-    pat = re.compile(
-        r"\b[\w\s\*]+\b" + re.escape(func_name) + r"\s*\([^)]*\)\s*\{", re.M
-    )
-    m = pat.search(code)
-    if not m:
+def decode_source(data):
+    """Decode file bytes the way open(path, "r", errors="ignore").read() would."""
+    return data.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def read_span(path, start, end):
+    """Read and decode bytes [start, end) of a source file."""
+    try:
+        with open(path, "rb") as fh:
+            fh.seek(start)
+            return decode_source(fh.read(end - start))
+    except IOError:
         return ""
-    i = m.end()
+
+
+def body_end(code, i):
+    """i is just past an opening brace; return the offset just past its matching close."""
     depth = 1
-    while i < len(code) and depth:
-        if code[i] == "{":
-            depth += 1
-        elif code[i] == "}":
-            depth -= 1
-        i += 1
-    return code[m.start() : i]
+    for m in BRACE_RE.finditer(code, i):
+        depth += 1 if m.group(0) == b"{" else -1
+        if not depth:
+            return m.end()
+    return len(code)
+
+
+def mask_noise(code):
+    """Blank out comments and string/char literals, keeping offsets and newlines."""
+    return NOISE_RE.sub(lambda m: re.sub(rb"[^\n]", b" ", m.group(0)), code)
+
+
+def index_code(code):
+    """
+    Return [name, signature, start, end] for every top-level function
+    definition in the bytes-like code, where signature is
+    'name(arg1, arg2, …)' and code[start:end] is the definition up to and
+    including its closing brace.
+    Comments and literals are masked first and bodies are skipped as a
+    whole, so nothing inside them is mistaken for a definition.
+    """
+    masked = mask_noise(code)
+    defs = []
+    pos = 0
+    while True:
+        m = DEF_RE.search(masked, pos)
+        if not m:
+            break
+        name = m.group(1).decode("ascii")
+        if name in IGNORE_TOKENS or MACRO_RE.match(name):
+            pos = m.end()
+            continue
+        end = body_end(masked, m.end())
+        args = decode_source(code[m.start(2) : m.end(2)]).strip()
+        defs.append([name, f"{name}({args})", m.start(), end])
+        pos = end
+    return defs
+
+
+def load_index(cache_path):
+    """
+    Load the definition index cache:
+    {path: {size, mtime_ns, sha1, defs: [[name, signature, start, end], ...]}},
+    with start/end as byte offsets.
+    A missing, unreadable or out-of-date cache is treated as empty.
+    """
+    if not cache_path or not os.path.isfile(cache_path):
+        return {}
+    try:
+        with open(cache_path) as fh:
+            data = json.load(fh)
+    except (IOError, ValueError):
+        return {}
+    if data.get("version") != INDEX_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def save_index(cache_path, entries):
+    """Atomically write the definition index cache."""
+    if not cache_path:
+        return
+    tmp = cache_path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump({"version": INDEX_VERSION, "files": entries}, fh)
+    os.replace(tmp, cache_path)
+
+
+def build_index(cache_path=None):
+    """
+    Index every function definition in the tree in a single pass and return
+    {name: (path, signature, start, end)}; when a name is defined more than
+    once the first file in walk order wins.
+
+    Files whose size and mtime match the cache are not read at all; files
+    that changed on disk are hashed and only re-indexed if their content
+    changed too. Files are memory-mapped one at a time, so the tree is never
+    held in memory.
+    """
+    cached = load_index(cache_path)
+    files = {}
+    reindexed = rehashed = 0
+    for path in list_source_files():
+        try:
+            st = os.stat(path)
+            entry = cached.get(path)
+            if not (entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns):
+                with open(path, "rb") as fh:
+                    # empty files cannot be mapped
+                    data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b""
+                try:
+                    sha1 = hashlib.sha1(data).hexdigest()
+                    if entry and entry["sha1"] == sha1:
+                        rehashed += 1
+                    else:
+                        reindexed += 1
+                        entry = {"sha1": sha1, "defs": index_code(data)}
+                finally:
+                    if st.st_size:
+                        data.close()
+                entry = dict(entry, size=st.st_size, mtime_ns=st.st_mtime_ns)
+        except IOError:
+            continue
+        files[path] = entry
+
+    if reindexed or rehashed or len(files) != len(cached):
+        save_index(cache_path, files)
+    print(
+        f"Indexed {len(files)} files: {len(files) - reindexed - rehashed} cached, "
+        f"{rehashed} unchanged content, {reindexed} parsed",
+        file=sys.stderr,
+    )
+
+    index = {}
+    for path, entry in files.items():
+        for name, sig, start, end in entry["defs"]:
+            index.setdefault(name, (path, sig, start, end))
+    return index
+
+
+def get_signature(func_name, index):
+    """Return 'func_name(arg1, arg2, …)' from the index, or 'func_name(' if unknown."""
+    if func_name in index:
+        return index[func_name][1]
+    return f"{func_name}("
+
+
+def span_calls(span):
+    """find_calls() on the body at span = (path, start, end), or on nothing if None."""
+    return find_calls(read_span(*span) if span else "")
 
 
 def find_calls(txt):
@@ -108,59 +276,319 @@ def find_calls(txt):
     return calls
 
 
-def find_definition(func, file_codes):
+def find_definition(func, index):
+    """Return the path of the file defining func, or None."""
+    if func in index:
+        return index[func][0]
+    return None
+
+
+def expand_graph(entry, depth, index, workers=0, known=None):
     """
-    Scan each file in file_codes for a definition of func.
-    Return the first path where extract_body is non-empty.
+    Breadth-first expansion of the call graph below entry, up to depth levels.
+    Every function's call set is computed at most once; the bodies of one
+    level are tokenized in parallel worker processes, each reading only the
+    span of its body from disk. Call sets found in known ({name: callees},
+    e.g. from a previous snapshot) are reused instead of re-tokenized.
+
+    Returns (levels, calls): levels maps each reached function to the level
+    it was first seen at (entry is 0), calls maps each expanded function to
+    its sorted callees (excluding itself).
     """
-    for path, code in file_codes.items():
-        if extract_body(code, func):
-            return path
-    return None
+    known = known or {}
+    levels = {entry: 0}
+    calls = {}
+    frontier = [entry]
+    tokenized = 0
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for level in range(1, depth + 1):
+            todo = [fn for fn in frontier if fn not in known]
+            spans = [(index[fn][0], index[fn][2], index[fn][3]) if fn in index else None for fn in todo]
+            if pool and len(spans) > 1:
+                chunksize = max(1, len(spans) // (workers * 4))
+                found = list(pool.map(span_calls, spans, chunksize=chunksize))
+            else:
+                found = [span_calls(s) for s in spans]
+            found = dict(zip(todo, found))
+            tokenized += len(todo)
+
+            next_frontier = []
+            for fn in frontier:
+                callees = set(known[fn]) if fn in known else found[fn]
+                callees.discard(fn)
+                calls[fn] = sorted(callees)
+                for c in calls[fn]:
+                    if c not in levels:
+                        levels[c] = level
+                        next_frontier.append(c)
+            frontier = sorted(next_frontier)
+    finally:
+        if pool:
+            pool.shutdown()
+    if known:
+        print(f"Tokenized {tokenized} of {len(calls)} functions (the rest reused)", file=sys.stderr)
+    return levels, calls
+
+
+def source_stats():
+    """Return {path: [size, mtime_ns]} for every indexed source file."""
+    stats = {}
+    for path in list_source_files():
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        stats[path] = [st.st_size, st.st_mtime_ns]
+    return stats
+
+
+def save_snapshot(path, entry, depth, levels, calls, index):
+    """
+    Write a graph snapshot:
+    {entry, depth, files: {path: [size, mtime_ns]},
+     functions: {name: {path, signature, level, calls}}}
+    where calls is only present for expanded functions.
+    """
+    functions = {}
+    for fn, level in levels.items():
+        info = {
+            "path": find_definition(fn, index),
+            "signature": get_signature(fn, index),
+            "level": level,
+        }
+        if fn in calls:
+            info["calls"] = calls[fn]
+        functions[fn] = info
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(
+            {
+                "version": SNAPSHOT_VERSION,
+                "entry": entry,
+                "depth": depth,
+                "files": source_stats(),
+                "functions": functions,
+            },
+            fh,
+        )
+    os.replace(tmp, path)
+
+
+def load_snapshot(path):
+    """Load a graph snapshot written by save_snapshot()."""
+    with open(path) as fh:
+        data = json.load(fh)
+    if data.get("version") != SNAPSHOT_VERSION:
+        sys.exit(f"{path}: unsupported snapshot version {data.get('version')}")
+    return data
+
+
+def changed_files(snapshot, rev=None):
+    """
+    Return the set of source files changed since the snapshot: from
+    `git diff --name-only rev` when rev is given, otherwise every file whose
+    size or mtime differs from the snapshot (including added and removed ones).
+    """
+    if rev:
+        out = subprocess.run(
+            ["git", "diff", "--name-only", rev, "--"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        return {os.path.normpath(line) for line in out.splitlines() if line}
+    before = snapshot.get("files", {})
+    now = source_stats()
+    changed = {p for p, st in now.items() if before.get(p) != st}
+    return changed | (set(before) - set(now))
+
+
+def reusable_calls(snapshot, index, changed):
+    """
+    Call sets from the snapshot that are still valid: the function is
+    defined in the same file as before and that file did not change.
+    """
+    known = {}
+    for fn, info in snapshot["functions"].items():
+        if "calls" not in info or info["path"] is None:
+            continue
+        path = find_definition(fn, index)
+        if path == info["path"] and os.path.normpath(path) not in changed:
+            known[fn] = info["calls"]
+    return known
+
+
+def print_changes(snapshot, levels, calls, index, changed):
+    """Report added/removed functions, changed signatures and added/removed edges."""
+    before = snapshot["functions"]
+    old_edges = {(fn, c) for fn, info in before.items() for c in info.get("calls", [])}
+    new_edges = {(fn, c) for fn, cs in calls.items() for c in cs}
+    added = sorted(set(levels) - set(before))
+    removed = sorted(set(before) - set(levels))
+    resigned = []
+    for fn in sorted(set(levels) & set(before)):
+        old = (before[fn]["path"], before[fn]["signature"])
+        new = (find_definition(fn, index), get_signature(fn, index))
+        if old != new:
+            resigned.append((fn, old, new))
+
+    print(f"\n=== Changes since the previous snapshot ({len(changed)} changed files) ===")
+    print(f"  Functions: +{len(added)} -{len(removed)}, {len(resigned)} changed signatures")
+    for fn in added:
+        print(f"    + {fn:<28s} (defined in {find_definition(fn, index) or '<unknown>'})")
+    for fn in removed:
+        print(f"    - {fn}")
+    for fn, (opath, osig), (npath, nsig) in resigned:
+        print(f"    ~ {osig} ({opath or '<unknown>'})")
+        print(f"      → {nsig} ({npath or '<unknown>'})")
+    print(f"  Edges: +{len(new_edges - old_edges)} -{len(old_edges - new_edges)}")
+    for a, b in sorted(new_edges - old_edges):
+        print(f"    + {a} -- {b}")
+    for a, b in sorted(old_edges - new_edges):
+        print(f"    - {a} -- {b}")
+
+
+def print_graph(entry, depth, levels, calls, index):
+    """Print the callees of every expanded function, level by level."""
+    print(f"=== Level 1 calls from {entry} ===")
+    for fn in calls[entry]:
+        path = find_definition(fn, index) or "<unknown>"
+        print(f"  [L1] {fn:<30s} (defined in {path})")
+
+    for level in range(2, depth + 1):
+        print(f"\n=== Level {level} calls (functions called by each Level {level - 1}) ===")
+        for fn in sorted(f for f, l in levels.items() if l == level - 1):
+            print(f"\n-- {fn} (Level {level - 1}) calls:")
+            if calls[fn]:
+                for c in calls[fn]:
+                    cpath = find_definition(c, index) or "<unknown>"
+                    print(f"    [L{level}] {c:<28s} (defined in {cpath})")
+            else:
+                print("    (no calls found or not in this codebase)")
+
+
+DOT_HEADER = """graph mupdf_call_graph_neato {
+  layout = dot;
+  rankdir = LR;          // left→right flow
+  splines = true;        // curved edges
+  nodesep  = 0.5;        // tighten node spacing
+  ranksep  = 0.75;
+  dpi      = 300;
+  size     = "8,8!";
+
+  node [
+    shape    = box
+    fontname = "Helvetica"
+    fontsize = 30
+    style    = filled
+  ];
+
+  "{entry}" [
+    shape=ellipse,
+    fillcolor=indianred,
+    fontsize=35,
+    margin="0.2,0.2",
+    fontname="Helvetica-Bold",
+    fontcolor=white,
+    orientation=180
+  ];
+"""
+# fill colours of the expanded levels 1, 2, ...; leaves are grey
+LEVEL_COLORS = ["lightpink", "lightsalmon", "khaki", "lightblue", "palegreen", "plum"]
+LEAF_COLOR = "grey80"
+
+
+def write_dot(path, entry, depth, levels, calls):
+    """
+    Write the call graph as a left-to-right Graphviz tree: expanded functions
+    are labelled with their number of callees and coloured by level, and
+    every call into a function that is not expanded at the next level ends
+    in a grey leaf node.
+    """
+
+    def label(fn, parent_level):
+        if fn == entry:
+            return fn
+        if fn in calls and levels[fn] == parent_level + 1:
+            return f"{fn} ({len(calls[fn])})"
+        return fn
+
+    lines = [DOT_HEADER.replace("{entry}", entry)]
+    leaves = []
+    for level in range(1, depth):
+        color = LEVEL_COLORS[(level - 1) % len(LEVEL_COLORS)]
+        lines.append(f"  /* Level-{level} nodes */")
+        for fn in sorted(f for f, l in levels.items() if l == level and f in calls):
+            lines.append(f'  {chr(34) + label(fn, level - 1) + chr(34):<39s} [fillcolor={color}];')
+        lines.append("")
+
+    edges = []
+    for level in range(depth):
+        parents = sorted(f for f, l in levels.items() if l == level and f in calls)
+        title = "Root → Level-1" if level == 0 else f"Level-{level} → Level-{level + 1}"
+        edges.append(f"  /* {title} */")
+        for fn in parents:
+            if not calls[fn]:
+                continue
+            for c in calls[fn]:
+                target = label(c, level)
+                if target == c and c not in leaves:
+                    leaves.append(c)
+                edges.append(f'  "{label(fn, level - 1)}" -- "{target}";')
+            if level:
+                edges.append("")
+        if not level:
+            edges.append("")
+
+    lines.append(f"  /* Level-{depth} nodes */")
+    for fn in leaves:
+        lines.append(f'  {chr(34) + fn + chr(34):<39s} [fillcolor={LEAF_COLOR}];')
+    lines.append("")
+    lines.append("  /* ─── Edges ─── */")
+    lines.append("")
+    while edges and edges[-1] == "":
+        edges.pop()
+    lines.extend(edges)
+    lines.append("}")
+    with open(path, "w") as out:
+        out.write("\n".join(lines) + "\n")
 
 
 def main():
-    file_codes = load_file_codes()
-    all_code = "\n".join(file_codes.values())
-
-    # Level 1
-    body = extract_body(all_code, "pdf_bake_document")
-    level1 = find_calls(body)
-    level1.discard("pdf_bake_document")
-    if not level1:
-        print("Couldn't find pdf_bake_document or it has no calls.", file=sys.stderr)
+    args = parse_args()
+    index = build_index(None if args.no_cache else args.cache)
+
+    snapshot = known = changed = None
+    if args.previous:
+        snapshot = load_snapshot(args.previous)
+        changed = changed_files(snapshot, args.changed_since)
+        known = reusable_calls(snapshot, index, changed)
+
+    levels, calls = expand_graph(args.entry, args.depth, index, args.workers, known)
+    if not calls.get(args.entry):
+        print(f"Couldn't find {args.entry} or it has no calls.", file=sys.stderr)
         sys.exit(1)
-        
+
+    print_graph(args.entry, args.depth, levels, calls, index)
+    if snapshot:
+        print_changes(snapshot, levels, calls, index, changed)
+
     funcs = set()  # set of "source_path,function"
+    for fn in levels:
+        if fn == args.entry:
+            continue
+        path = find_definition(fn, index) or "<unknown>"
+        funcs.add(f"{path},{get_signature(fn, index)}")
 
-    print("=== Level 1 calls from pdf_bake_document ===")
-    for fn in sorted(level1):
-        path = find_definition(fn, file_codes) or "<unknown>"
-        print(f"  [L1] {fn:<30s} (defined in {path})")
-        sig = get_signature(fn, file_codes.get(path))
-        funcs.add(f"{path},{sig}")
-
-    # Level 2
-    print("\n=== Level 2 calls (functions called by each Level 1) ===")
-    for fn in sorted(level1):
-        print(f"\n-- {fn} (Level 1) calls:")
-        def_path = find_definition(fn, file_codes)
-        src = file_codes.get(def_path, all_code)
-        calls = find_calls(extract_body(src, fn))
-        calls.discard(fn)
-        if calls:
-            for c in sorted(calls):
-                cpath = find_definition(c, file_codes) or "<unknown>"
-                print(f"    [L2] {c:<28s} (defined in {cpath})")
-                sig = get_signature(c, file_codes.get(cpath))
-                funcs.add(f"{cpath},{sig}")
-        else:
-            print("    (no calls found or not in this codebase)")
-    
-    with open(OUT_FILE, "w") as out:
+    with open(args.out, "w") as out:
         for fn in funcs:
             out.write(f"{fn}\n")
-    print(f"\n→ Wrote {len(funcs)} unique entries to {OUT_FILE}")
+    write_dot(args.dot, args.entry, args.depth, levels, calls)
+    if args.snapshot:
+        save_snapshot(args.snapshot, args.entry, args.depth, levels, calls, index)
+    print(f"\n→ Wrote {len(funcs)} unique entries to {args.out} and the graph to {args.dot}")
 
 if __name__ == "__main__":
     main()
@@ -8,8 +8,11 @@ signatures and their locations (generated by cg.py)
 import os
 import sys
 import argparse
+import re
 import csv
-from bs4 import BeautifulSoup
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
 from tabulate import tabulate
 
 
@@ -19,15 +22,59 @@ def parse_args():
     )
     p.add_argument(
         "--report-dir",
-        required=True,
-        help="root of coverage HTML (e.g. REPORT_*/linux/src/mupdf)",
+        default=[],
+        nargs="+",
+        action="extend",
+        help="root of coverage HTML (e.g. REPORT_*/linux/src/mupdf); give several "
+        "(or repeat the option) to compare reports side by side",
+    )
+    p.add_argument(
+        "--json",
+        default=[],
+        nargs="+",
+        action="extend",
+        help="`llvm-cov export` JSON file(s) to read instead of (or next to) HTML "
+        "reports; streamed, so exports of any size work",
+    )
+    p.add_argument(
+        "--series",
+        default=[],
+        nargs="+",
+        action="extend",
+        help="ordered coverage snapshots (report directories) of one run; prints "
+        "coverage over time, re-parsing only report files whose content changed",
+    )
+    p.add_argument(
+        "--label",
+        action="append",
+        default=[],
+        help="column name for the matching report, in the order --report-dir "
+        "then --json, or for the matching --series snapshot (default: the path)",
+    )
+    p.add_argument(
+        "--csv",
+        help="also write the per-function table (or comparison matrix, or "
+        "coverage-over-time series) to this CSV file",
+    )
+    p.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=0,
+        help="processes used to extract several reports (default: one per report, "
+        "up to the CPU count)",
     )
     p.add_argument(
         "--functions",
         required=True,
         help="CSV file: source_path,func_name (one per line, where func_name includes args)",
     )
-    return p.parse_args()
+    args = p.parse_args()
+    if args.series and (args.report_dir or args.json):
+        p.error("--series cannot be combined with --report-dir or --json")
+    if not args.report_dir and not args.json and not args.series:
+        p.error("at least one --report-dir, --json or --series is required")
+    return args
 
 
 def load_functions(fn):
@@ -42,34 +89,95 @@ def load_functions(fn):
     return funcs
 
 
-def extract_stats(html_path, func_name):
+class CoverageTableParser(HTMLParser):
     """
-    Parses the HTML coverage file, finds the exact declaration line matching
-    'func_name' (including args), then scans its { ... } body.
-    Returns (total, covered, start_line, end_line).
+    Streaming parser for an llvm-cov HTML source view. Every <tr> with at
+    least three cells becomes one (line_no, hits, code) row, where hits is
+    the text of the first <pre> in the second cell (None for lines without
+    a count) and code is the text of the third cell. Rows are kept in
+    document order, mirroring BeautifulSoup's find_all("tr").
     """
-    soup = BeautifulSoup(open(html_path, "r", encoding="utf8"), "html.parser")
-    rows = soup.find_all("tr")
 
-    total = uncovered = 0
-    found_decl = False
-    in_body = False
-    brace_depth = 0
-    start_ln = end_ln = None
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self._rows = []  # stack of open rows: (index into self.rows, cells)
+        self._cells = []  # stack of open cells: [text parts, pre parts, pre depth]
 
-    for tr in rows:
-        tds = tr.find_all("td")
-        if len(tds) < 3:
-            continue
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self.rows.append(None)
+            self._rows.append((len(self.rows) - 1, []))
+        elif tag == "td" and self._rows:
+            cell = [[], None, 0]
+            self._rows[-1][1].append(cell)
+            self._cells.append(cell)
+        elif tag == "pre":
+            for cell in self._cells:
+                if cell[1] is None:
+                    cell[1], cell[2] = [], 1
+                elif cell[2]:
+                    cell[2] += 1
+
+    def handle_endtag(self, tag):
+        if tag == "pre":
+            for cell in self._cells:
+                if cell[2]:
+                    cell[2] -= 1
+        elif tag == "td" and self._cells:
+            self._cells.pop()
+        elif tag == "tr" and self._rows:
+            idx, cells = self._rows.pop()
+            # drop cells of this row left open by malformed markup
+            while self._cells and any(self._cells[-1] is c for c in cells):
+                self._cells.pop()
+            self.rows[idx] = self._make_row(cells)
 
-        ln_txt = tds[0].get_text().strip()
+    def handle_data(self, data):
+        for cell in self._cells:
+            cell[0].append(data)
+            if cell[2]:
+                cell[1].append(data)
+
+    @staticmethod
+    def _make_row(cells):
+        if len(cells) < 3:
+            return None
         try:
-            ln = int(ln_txt)
+            ln = int("".join(cells[0][0]).strip())
         except ValueError:
             ln = None
+        pre = cells[1][1]
+        hits = "".join(pre).strip() if pre is not None else None
+        return ln, hits, "".join(cells[2][0]).strip()
+
+    def table(self):
+        return [r for r in self.rows if r is not None]
+
+
+def load_line_table(html_path):
+    """Parse a coverage HTML file once into a list of (line_no, hits, code) rows."""
+    parser = CoverageTableParser()
+    with open(html_path, "r", encoding="utf8") as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), ""):
+            parser.feed(chunk)
+    parser.close()
+    return parser.table()
 
-        code = tds[2].get_text().strip()
 
+def function_lines(table, func_name):
+    """
+    Finds the exact declaration line matching 'func_name' (including args)
+    in a line table, then scans its { ... } body.
+    Returns ([(line_no, hit) for every line with a count], start_line, end_line).
+    """
+    lines = []
+    found_decl = False
+    in_body = False
+    brace_depth = 0
+    start_ln = end_ln = None
+
+    for ln, hits, code in table:
         if not found_decl:
             if func_name in code and code.endswith(")"):
                 found_decl = True
@@ -83,12 +191,8 @@ def extract_stats(html_path, func_name):
             continue
 
         # inside function body
-        hit_pre = tds[1].find("pre")
-        if hit_pre:
-            total += 1
-            hit = hit_pre.get_text().strip()
-            if hit == "0":
-                uncovered += 1
+        if hits is not None:
+            lines.append((ln, hits != "0"))
 
         if ln is not None:
             end_ln = ln
@@ -100,23 +204,284 @@ def extract_stats(html_path, func_name):
                 break
             brace_depth -= 1
 
-    return total, (total - uncovered), start_ln, end_ln
+    return lines, start_ln, end_ln
 
 
-def main():
-    args = parse_args()
-    funcs = load_functions(args.functions)
+def function_stats(table, func_name):
+    """
+    Like function_lines(), but returns (total, covered, start_line, end_line).
+    """
+    lines, start_ln, end_ln = function_lines(table, func_name)
+    return len(lines), sum(1 for _, hit in lines if hit), start_ln, end_ln
+
 
+def extract_stats(html_path, func_name):
+    """
+    Parses the HTML coverage file, finds the exact declaration line matching
+    'func_name' (including args), then scans its { ... } body.
+    Returns (total, covered, start_line, end_line).
+    """
+    return function_stats(load_line_table(html_path), func_name)
+
+
+# llvm-cov region kinds (llvm::coverage::CounterMappingRegion::RegionKind)
+CODE_REGION, EXPANSION_REGION, SKIPPED_REGION, GAP_REGION = 0, 1, 2, 3
+
+
+def region_line_counts(regions):
+    """
+    Per-line execution counts of one function from its llvm-cov regions,
+    following llvm-cov's line rules: a line is executable when a code
+    region starts on it or when it is wrapped by a region that is not a
+    skipped one; its count is the max of the starting regions' counts and
+    the wrapping region's count.
+    Only regions in the function's own file (file id 0) are considered.
+    """
+    spans = [
+        (r[0], r[1], r[2], r[3], r[4], r[7])
+        for r in regions
+        if len(r) >= 8 and r[5] == 0 and r[7] <= GAP_REGION
+    ]
+    if not spans:
+        return {}
+    spans.sort(key=lambda s: (s[0], s[1]))
+
+    counts = {}
+    first = min(s[0] for s in spans)
+    last = max(s[2] for s in spans)
+    for line in range(first, last + 1):
+        starting = [
+            s[4] for s in spans if s[0] == line and s[5] in (CODE_REGION, EXPANSION_REGION)
+        ]
+        wrapped = None
+        for s in spans:
+            if s[0] > line:
+                break
+            if (s[0], s[1]) < (line, 1) and (s[2], s[3]) >= (line, 1):
+                wrapped = s  # spans are sorted, so the last one is innermost
+        if wrapped and wrapped[5] == SKIPPED_REGION:
+            wrapped = None
+        if starting:
+            counts[line] = max(starting + [wrapped[4] if wrapped else 0])
+        elif wrapped:
+            counts[line] = wrapped[4]
+    return counts
+
+
+def json_report_lines(json_path, funcs):
+    """
+    Extract the per-line counts of every function in funcs from an
+    `llvm-cov export` JSON file, streaming it function by function with
+    ijson so the export is never loaded as a whole. Functions instantiated
+    more than once (e.g. static inlines from headers) are merged line by line.
+    Like function_stats(), the line of the opening brace (where the body's
+    region starts) is not counted.
+    Returns {index into funcs: {line: count}}.
+    """
+    import ijson
+
+    wanted = {}
+    for idx, (source_path, func) in enumerate(funcs):
+        wanted.setdefault(func.split("(")[0].strip(), []).append((idx, source_path))
+
+    lines = {}
+    with open(json_path, "rb") as fh:
+        for fn in ijson.items(fh, "data.item.functions.item"):
+            # static functions are exported as "file.c:name"
+            name = fn.get("name", "").rsplit(":", 1)[-1]
+            if name not in wanted:
+                continue
+            filenames = fn.get("filenames") or [""]
+            for idx, source_path in wanted[name]:
+                if not filenames[0].endswith(source_path):
+                    continue
+                merged = lines.setdefault(idx, {})
+                counts = region_line_counts(fn.get("regions", []))
+                if counts:
+                    del counts[min(counts)]
+                for line, count in counts.items():
+                    merged[line] = max(count, merged.get(line, 0))
+    return lines
+
+
+def extract_json_report(json_path, funcs):
+    """
+    Extract the stats of every function in funcs from an `llvm-cov export`
+    JSON file (see json_report_lines()).
+    Returns {index into funcs: (total, covered, start_line, end_line)}.
+    """
+    stats = {}
+    for idx, merged in json_report_lines(json_path, funcs).items():
+        total = len(merged)
+        covered = sum(1 for c in merged.values() if c > 0)
+        start = min(merged) if merged else None
+        end = max(merged) if merged else None
+        stats[idx] = (total, covered, start, end)
+    return stats
+
+
+def extract_report(report_dir, funcs):
+    """
+    Extract the stats of every function in funcs from one report directory
+    (or `llvm-cov export` JSON file).
+    Returns {index into funcs: (total, covered, start_line, end_line)};
+    functions whose report file is missing are left out.
+    """
+    if os.path.isfile(report_dir):
+        return extract_json_report(report_dir, funcs)
+
+    # Parse every report file exactly once, resolving all of its functions
+    # against the same line table.
+    by_file = {}
+    for idx, (source_path, func) in enumerate(funcs):
+        by_file.setdefault(source_path, []).append((idx, func))
+
+    stats = {}
+    for source_path, entries in by_file.items():
+        html_file = os.path.join(report_dir, source_path + ".html")
+        if not os.path.isfile(html_file):
+            continue
+        table = load_line_table(html_file)
+        for idx, func in entries:
+            stats[idx] = function_stats(table, func)
+    return stats
+
+
+def covered_lines(report_dir, funcs):
+    """
+    The lines of the functions in funcs that one report directory (or
+    `llvm-cov export` JSON file) shows as executed.
+    Returns {index into funcs: set of line numbers}; functions whose report
+    file is missing are left out.
+    """
+    if os.path.isfile(report_dir):
+        return {
+            idx: {line for line, count in merged.items() if count > 0}
+            for idx, merged in json_report_lines(report_dir, funcs).items()
+        }
+
+    by_file = {}
+    for idx, (source_path, func) in enumerate(funcs):
+        by_file.setdefault(source_path, []).append((idx, func))
+
+    lines = {}
+    for source_path, entries in by_file.items():
+        html_file = os.path.join(report_dir, source_path + ".html")
+        if not os.path.isfile(html_file):
+            continue
+        table = load_line_table(html_file)
+        for idx, func in entries:
+            lines[idx] = {ln for ln, hit in function_lines(table, func)[0] if hit}
+    return lines
+
+
+def file_digest(path):
+    """SHA-1 of a file's contents, read in chunks."""
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# llvm-cov stamps every HTML page with its creation time
+CREATED_RE = re.compile(rb"Created: [^<]*")
+
+
+def report_digest(path):
+    """
+    SHA-1 of a report file's contents without its "Created: <time>" stamp,
+    so pages that only differ in when they were rendered hash the same.
+    The stamp is in the page header, so only the first chunk is normalized.
+    """
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        h.update(CREATED_RE.sub(b"", fh.read(1 << 20), count=1))
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_stats(html_file, entries):
+    """Parse one report file and return {idx: stats} for its (idx, func) entries."""
+    table = load_line_table(html_file)
+    return {idx: function_stats(table, func) for idx, func in entries}
+
+
+def extract_series(snapshot_dirs, funcs, workers=0):
+    """
+    Extract the stats of every function in funcs from an ordered series of
+    report directories. Each needed report file is hashed (ignoring its
+    creation timestamp, see report_digest()), and only file contents not
+    seen in an earlier snapshot are parsed (in parallel); the stats of
+    unchanged files are reused.
+    Returns (list of {idx: stats} per snapshot, changed files per snapshot).
+    """
+    by_file = {}
+    for idx, (source_path, func) in enumerate(funcs):
+        by_file.setdefault(source_path, []).append((idx, func))
+
+    digests, changed, jobs = [], [], {}
+    prev = {}
+    for report_dir in snapshot_dirs:
+        cur = {}
+        for source_path in by_file:
+            html_file = os.path.join(report_dir, source_path + ".html")
+            if os.path.isfile(html_file):
+                cur[source_path] = report_digest(html_file)
+                jobs.setdefault((source_path, cur[source_path]), html_file)
+        changed.append(sum(1 for s, h in cur.items() if prev.get(s) != h))
+        digests.append(cur)
+        prev = cur
+
+    keys = list(jobs)
+    files = [jobs[k] for k in keys]
+    entries = [by_file[k[0]] for k in keys]
+    if len(keys) <= 1:
+        results = list(map(file_stats, files, entries))
+    else:
+        workers = workers or min(len(keys), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(file_stats, files, entries))
+    parsed = dict(zip(keys, results))
+    print(
+        f"Parsed {len(keys)} of {sum(len(d) for d in digests)} report files "
+        f"across {len(snapshot_dirs)} snapshots (the rest were unchanged)",
+        file=sys.stderr,
+    )
+
+    series = []
+    for cur in digests:
+        stats = {}
+        for source_path, digest in cur.items():
+            stats.update(parsed[(source_path, digest)])
+        series.append(stats)
+    return series, changed
+
+
+def extract_reports(report_dirs, funcs, workers=0):
+    """Run extract_report() for every directory, in parallel processes."""
+    if len(report_dirs) == 1:
+        return [extract_report(report_dirs[0], funcs)]
+    workers = workers or min(len(report_dirs), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(extract_report, report_dirs, [funcs] * len(report_dirs)))
+
+
+def print_report(report_dir, funcs, stats):
+    """Print the per-function table and overall coverage of a single report."""
     grand_tot = grand_cov = 0
     results = []
 
-    for source_path, func in funcs:
-        html_file = os.path.join(args.report_dir, source_path + ".html")
-        if not os.path.isfile(html_file):
+    for idx, (source_path, func) in enumerate(funcs):
+        if idx not in stats:
+            if os.path.isfile(report_dir):
+                print(f"Warning: {func} not found in {report_dir}; skipping", file=sys.stderr)
+                continue
+            html_file = os.path.join(report_dir, source_path + ".html")
             print(f"Warning: {html_file} not found; skipping {func}", file=sys.stderr)
             continue
-
-        tot, cov, start, end = extract_stats(html_file, func)
+        tot, cov, start, end = stats[idx]
         if tot == 0:
             print(f"Warning: no lines found for {func}", file=sys.stderr)
             continue
@@ -143,5 +508,139 @@ def main():
     print(f"  Coverage      = {overall:.1f}%\n")
 
 
+def comparison_rows(funcs, all_stats):
+    """
+    Yield (source_path, function, [(covered, total) or None per report]) for
+    every function found in at least one report, then a TOTAL row.
+    """
+    totals = [[0, 0] for _ in all_stats]
+    for idx, (source_path, func) in enumerate(funcs):
+        cells = []
+        for n, stats in enumerate(all_stats):
+            tot, cov, _, _ = stats.get(idx, (0, 0, None, None))
+            if tot:
+                cells.append((cov, tot))
+                totals[n][0] += cov
+                totals[n][1] += tot
+            else:
+                cells.append(None)
+        if any(cells):
+            yield source_path, func.split("(")[0], cells
+    yield "", "TOTAL", [tuple(t) if t[1] else None for t in totals]
+
+
+def _pct(cell):
+    return cell[0] / cell[1] * 100
+
+
+def print_comparison(labels, funcs, all_stats):
+    """Print a function × report matrix with deltas against the first report."""
+    headers = ["File", "Function", labels[0]]
+    for label in labels[1:]:
+        headers += [label, "Δ"]
+
+    rows = []
+    for source_path, func, cells in comparison_rows(funcs, all_stats):
+        row = [source_path, func]
+        base = cells[0]
+        for n, cell in enumerate(cells):
+            row.append(f"{cell[0]}/{cell[1]} ({_pct(cell):.1f}%)" if cell else "-")
+            if n == 0:
+                continue
+            if cell and base:
+                row.append(f"{cell[0] - base[0]:+d} ({_pct(cell) - _pct(base):+.1f}pp)")
+            else:
+                row.append("")
+        rows.append(row)
+    print(tabulate(rows, headers=headers, tablefmt="github"))
+
+
+def print_series(labels, funcs, series, changed):
+    """Print total coverage per snapshot, then every function's curve."""
+    *per_function, (_, _, totals) = comparison_rows(funcs, series)
+    rows = []
+    prev = plateau = None
+    for n, (label, cell) in enumerate(zip(labels, totals)):
+        cov, tot = cell or (0, 0)
+        if prev is None or cov > prev:
+            plateau = label
+        rows.append(
+            [
+                n,
+                label,
+                changed[n],
+                f"{cov}/{tot}",
+                f"{(cov / tot * 100 if tot else 0):5.1f}%",
+                "" if prev is None else f"{cov - prev:+d}",
+            ]
+        )
+        prev = cov
+    headers = ["#", "Snapshot", "Changed files", "Coverage", "Pct%", "Δ"]
+    print(tabulate(rows, headers=headers, tablefmt="github"))
+    print(f"\nTotal coverage last increased at: {plateau}\n")
+
+    rows = [
+        [source_path, func] + [f"{c[0]}/{c[1]}" if c else "-" for c in cells]
+        for source_path, func, cells in per_function
+    ]
+    print(tabulate(rows, headers=["File", "Function"] + labels, tablefmt="github"))
+
+
+def write_series_csv(path, labels, funcs, series):
+    """Write the coverage-over-time series as CSV, one row per snapshot and function."""
+    with open(path, "w", newline="") as fh:
+        w = csv.writer(fh)
+        w.writerow(["snapshot", "label", "file", "function", "covered", "total", "pct"])
+        for source_path, func, cells in comparison_rows(funcs, series):
+            for n, cell in enumerate(cells):
+                if cell:
+                    w.writerow([n, labels[n], source_path, func, cell[0], cell[1], f"{_pct(cell):.1f}"])
+
+
+def write_csv(path, labels, funcs, all_stats):
+    """Write the comparison matrix (one report is a 1-column matrix) as CSV."""
+    header = ["file", "function"]
+    for n, label in enumerate(labels):
+        header += [f"{label}:covered", f"{label}:total", f"{label}:pct"]
+        if n:
+            header += [f"{label}:delta"]
+    with open(path, "w", newline="") as fh:
+        w = csv.writer(fh)
+        w.writerow(header)
+        for source_path, func, cells in comparison_rows(funcs, all_stats):
+            row = [source_path, func]
+            for n, cell in enumerate(cells):
+                row += [cell[0], cell[1], f"{_pct(cell):.1f}"] if cell else ["", "", ""]
+                if n:
+                    base = cells[0]
+                    row.append(cell[0] - base[0] if cell and base else "")
+            w.writerow(row)
+
+
+def main():
+    args = parse_args()
+    funcs = load_functions(args.functions)
+
+    if args.series:
+        labels = args.label + args.series[len(args.label):]
+        series, changed = extract_series(args.series, funcs, args.workers)
+        print_series(labels, funcs, series, changed)
+        if args.csv:
+            write_series_csv(args.csv, labels, funcs, series)
+        return
+
+    report_dirs = args.report_dir + args.json
+    labels = args.label + report_dirs[len(args.label):]
+
+    all_stats = extract_reports(report_dirs, funcs, args.workers)
+
+    if len(report_dirs) == 1:
+        print_report(report_dirs[0], funcs, all_stats[0])
+    else:
+        print_comparison(labels, funcs, all_stats)
+    if args.csv:
+        write_csv(args.csv, labels, funcs, all_stats)
+
+
 if __name__ == "__main__":
     main()
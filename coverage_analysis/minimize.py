@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Minimize a seed corpus without losing coverage of the covmeta functions.
+
+Every seed needs its own coverage report: either one per seed already in
+--reports (named after the seed's file name without extension: an
+`llvm-cov export` JSON file <name>.json or an HTML report directory
+<name>/), or a --run-cmd that runs the fuzzer on one seed and writes its
+report to {report}. The lines of the --functions list that each report
+shows as executed are extracted with covmeta's parser, in parallel, and
+kept in --work-dir, so an interrupted run picks up where it stopped and
+only new or changed seeds are processed again.
+
+The kept subset is a greedy weighted set cover of the union of those
+lines: the seed with the most not yet covered lines per byte is taken
+until every line is covered, then seeds whose lines the others cover
+anyway are dropped, largest first. The subset is written as a list of
+paths (--out) and optionally copied into a directory (--copy-to).
+"""
+
+import os
+import sys
+import json
+import heapq
+import shlex
+import shutil
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from covmeta import load_functions, covered_lines, file_digest
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Keep the smallest set of seeds that preserves their union coverage.")
+    p.add_argument("corpus", help="directory of seeds to minimize")
+    p.add_argument(
+        "--functions",
+        required=True,
+        help="CSV file: source_path,func_name (e.g. bake_funky.txt), as for covmeta.py",
+    )
+    source = p.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--reports",
+        help="directory with one coverage report per seed: <name>.json (llvm-cov export) or <name>/ (HTML)",
+    )
+    source.add_argument(
+        "--run-cmd",
+        help="shell command writing the coverage report of {seed} to {report} (a JSON export "
+        "or an HTML report directory), e.g. './cov_one.sh {seed} {report}'",
+    )
+    p.add_argument(
+        "--html-subdir",
+        default="",
+        help="path inside an HTML report directory to the source views (e.g. linux/src/mupdf)",
+    )
+    p.add_argument(
+        "--work-dir",
+        default="minimize_work",
+        help="extracted lines (and --run-cmd reports) are kept here between runs (default: minimize_work)",
+    )
+    p.add_argument("-j", "--workers", type=int, default=0, help="parallel seeds (default: the CPU count)")
+    p.add_argument("--out", default="minimized.txt", help="file listing the kept seeds (default: minimized.txt)")
+    p.add_argument("--copy-to", help="also copy the kept seeds into this directory")
+    return p.parse_args()
+
+
+def seed_key(name):
+    """Report name of a seed: its file name without extension."""
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def report_path(report, html_subdir):
+    """The JSON file or the HTML source view root of a report."""
+    return report if os.path.isfile(report) else os.path.join(report, html_subdir)
+
+
+def seed_lines(seed, report, run_cmd, html_subdir, funcs, cache_path, cache_tag):
+    """
+    Extract (running run_cmd first, if given) the covered lines of one seed
+    and store them in cache_path. Returns [[function index, line], ...],
+    or None when no report could be produced.
+    """
+    if run_cmd:
+        if os.path.isdir(report):
+            shutil.rmtree(report)
+        elif os.path.exists(report):
+            os.remove(report)
+        cmd = run_cmd.format(seed=shlex.quote(seed), report=shlex.quote(report))
+        if subprocess.run(cmd, shell=True, stdout=subprocess.DEVNULL).returncode != 0:
+            return None
+    if not os.path.exists(report):
+        return None
+    lines = covered_lines(report_path(report, html_subdir), funcs)
+    pairs = sorted([idx, line] for idx, hit in lines.items() for line in hit)
+    tmp = cache_path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(dict(cache_tag, lines=pairs), fh)
+    os.replace(tmp, cache_path)
+    return pairs
+
+
+def collect_lines(args, seeds, funcs):
+    """Return {seed path: set of (function index, line)}, from the cache or extracted."""
+    lines_dir = os.path.join(args.work_dir, "lines")
+    reports_dir = os.path.join(args.work_dir, "reports")
+    os.makedirs(lines_dir, exist_ok=True)
+    if args.run_cmd:
+        os.makedirs(reports_dir, exist_ok=True)
+    functions_digest = file_digest(args.functions)
+
+    lines, jobs = {}, {}
+    for seed in seeds:
+        key = seed_key(seed)
+        cache_path = os.path.join(lines_dir, key + ".json")
+        tag = {"seed": file_digest(seed), "functions": functions_digest}
+        if args.reports:
+            report = os.path.join(args.reports, key + ".json")
+            if not os.path.isfile(report):
+                report = os.path.join(args.reports, key)
+            if os.path.exists(report):
+                tag["report_mtime"] = os.path.getmtime(report)
+        else:
+            report = os.path.join(reports_dir, key)
+        try:
+            with open(cache_path) as fh:
+                cached = json.load(fh)
+            if all(cached.get(k) == v for k, v in tag.items()):
+                lines[seed] = {tuple(pair) for pair in cached["lines"]}
+                continue
+        except (OSError, ValueError):
+            pass
+        jobs[seed] = (seed, report, args.run_cmd, args.html_subdir, funcs, cache_path, tag)
+
+    print(f"{len(lines)} of {len(seeds)} seeds cached in {lines_dir}, processing {len(jobs)}", file=sys.stderr)
+    if not jobs:
+        return lines
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(seed_lines, *job): seed for seed, job in jobs.items()}
+        for done, future in enumerate(as_completed(futures), 1):
+            seed = futures[future]
+            pairs = future.result()
+            if pairs is None:
+                print(f"Warning: no coverage report for {seed}; it covers nothing", file=sys.stderr)
+                pairs = []
+            lines[seed] = {tuple(pair) for pair in pairs}
+            if done % 50 == 0 or done == len(jobs):
+                print(f"  {done}/{len(jobs)} seeds processed", file=sys.stderr)
+    return lines
+
+
+def greedy_cover(lines, sizes):
+    """
+    Greedy weighted set cover of the union of lines (seed -> set): take the
+    seed with the most uncovered lines per byte (ties: smaller, then by
+    name) until everything is covered, re-scoring seeds lazily, then drop
+    kept seeds that the others make redundant, largest first.
+    """
+    heap = [(-len(s) / max(1, sizes[seed]), sizes[seed], seed) for seed, s in lines.items() if s]
+    heapq.heapify(heap)
+    covered, kept = set(), []
+    while heap:
+        _, size, seed = heapq.heappop(heap)
+        gain = len(lines[seed] - covered)
+        if not gain:
+            continue
+        score = (-gain / max(1, size), size, seed)
+        if heap and heap[0] < score:
+            heapq.heappush(heap, score)  # stale score, re-rank
+            continue
+        kept.append(seed)
+        covered |= lines[seed]
+
+    count = {}
+    for seed in kept:
+        for line in lines[seed]:
+            count[line] = count.get(line, 0) + 1
+    for seed in sorted(kept, key=lambda s: -sizes[s]):
+        if all(count[line] > 1 for line in lines[seed]):
+            kept.remove(seed)
+            for line in lines[seed]:
+                count[line] -= 1
+    return sorted(kept), covered
+
+
+def main():
+    args = parse_args()
+    funcs = load_functions(args.functions)
+    seeds = sorted(de.path for de in os.scandir(args.corpus) if de.is_file())
+    if not seeds:
+        sys.exit(f"Error: no seeds in {args.corpus}")
+    if args.run_cmd and "{report}" not in args.run_cmd:
+        sys.exit("Error: --run-cmd must contain {report}")
+
+    lines = collect_lines(args, seeds, funcs)
+    sizes = {seed: os.path.getsize(seed) for seed in seeds}
+    kept, covered = greedy_cover(lines, sizes)
+
+    with open(args.out, "w") as fh:
+        fh.writelines(seed + "\n" for seed in kept)
+    if args.copy_to:
+        os.makedirs(args.copy_to, exist_ok=True)
+        for seed in kept:
+            shutil.copy2(seed, args.copy_to)
+
+    total, kept_bytes = sum(sizes.values()), sum(sizes[s] for s in kept)
+    per_func = {}
+    for idx, _ in covered:
+        per_func[idx] = per_func.get(idx, 0) + 1
+    print(f"Kept {len(kept)} of {len(seeds)} seeds, {kept_bytes} of {total} bytes "
+          f"({100.0 * kept_bytes / max(1, total):.1f}%), covering all {len(covered)} lines "
+          f"in {len(per_func)} of {len(funcs)} functions -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
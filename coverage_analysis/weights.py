@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Learn per-subtype annotation weights for the seed generators from coverage.
+
+Input is a covmeta.py comparison CSV with one report per seed (run covmeta
+with one --report-dir/--json per seed and --label set to the seed's file
+name) and a sum.py --manifest of the same seeds, whose subtype_<Name>
+columns say which annotation subtypes every seed contains. The two are
+joined on the label / manifest fname.
+
+Every function gets a rarity of 1 / (1 + number of seeds that cover any of
+its lines), and a seed's value is the sum over functions of the fraction
+of the function it covers times that rarity, divided by the seed's size:
+rare coverage per byte. A subtype's weight is the mean value of the seeds
+containing it relative to the mean of all seeds, shrunk towards 1 for
+subtypes seen in few seeds; pairs of subtypes that occur together in a
+seed are weighted the same way. The result is written as JSON for the
+generators' --weights option:
+
+    {"subtypes": {"Widget": 1.8, ...}, "pairs": {"FreeText+Widget": 1.3, ...},
+     "seeds": 120, "functions": 54}
+"""
+
+import os
+import sys
+import csv
+import json
+import argparse
+import itertools
+
+# the manifest format is sum.py's, in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sum import SUBTYPE_PREFIX, read_manifest
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Learn annotation subtype weights from per-seed coverage.")
+    p.add_argument("--coverage", required=True, help="covmeta.py --csv output with one labelled report per seed")
+    p.add_argument("--manifest", required=True, help="sum.py --manifest of the seeds (.parquet, .feather/.arrow or .csv)")
+    p.add_argument("--out", default="weights.json", help="JSON file to write (default: weights.json)")
+    p.add_argument(
+        "--prior",
+        type=float,
+        default=2.0,
+        help="pseudo-seeds of weight 1 mixed into every estimate, so subtypes seen "
+        "in few seeds stay close to 1 (default: 2)",
+    )
+    p.add_argument(
+        "--min-pair-seeds",
+        type=int,
+        default=3,
+        help="only weight subtype pairs that occur together in at least this many seeds (default: 3)",
+    )
+    return p.parse_args()
+
+
+def read_coverage(path):
+    """
+    Read a covmeta comparison CSV into {label: {function: (covered, total)}},
+    without the TOTAL row; functions missing from a report are left out.
+    """
+    coverage = {}
+    with open(path, newline="") as fh:
+        reader = csv.reader(fh)
+        header = next(reader)
+        columns = {}
+        for n, name in enumerate(header):
+            label, _, field = name.rpartition(":")
+            if field in ("covered", "total"):
+                columns.setdefault(label, {})[field] = n
+        for row in reader:
+            if row[1] == "TOTAL":
+                continue
+            func = f"{row[0]}:{row[1]}"
+            for label, col in columns.items():
+                covered, total = row[col["covered"]], row[col["total"]]
+                if total and int(total):
+                    coverage.setdefault(label, {})[func] = (int(covered), int(total))
+    return coverage
+
+
+def seed_key(name):
+    """Join key of a covmeta label or manifest fname: the file name without extension."""
+    return os.path.splitext(os.path.basename(name.rstrip("/")))[0]
+
+
+def seed_values(coverage, sizes):
+    """Rarity-weighted covered fraction per byte for every seed in both inputs."""
+    hits = {}
+    for funcs in coverage.values():
+        for func, (covered, _) in funcs.items():
+            if covered:
+                hits[func] = hits.get(func, 0) + 1
+    values = {}
+    for label, funcs in coverage.items():
+        key = seed_key(label)
+        if key not in sizes:
+            continue
+        gain = sum(covered / total / (1 + hits.get(func, 0)) for func, (covered, total) in funcs.items())
+        values[key] = gain / max(1, sizes[key])
+    return values, len(hits)
+
+
+def shrunk_weights(groups, values, mean, prior):
+    """Mean value of each group's seeds relative to mean, shrunk towards 1 by prior pseudo-seeds."""
+    weights = {}
+    for name, keys in sorted(groups.items()):
+        total = sum(values[k] for k in keys) / mean
+        weights[name] = round((total + prior) / (len(keys) + prior), 4)
+    return weights
+
+
+def learn_weights(coverage, manifest, prior=2.0, min_pair_seeds=3):
+    sizes = {seed_key(f): s for f, s in zip(manifest["fname"], manifest["size"])}
+    values, n_functions = seed_values(coverage, sizes)
+    if not values:
+        raise ValueError("no covmeta label matches a manifest fname")
+    mean = sum(values.values()) / len(values) or 1.0
+
+    subtype_cols = [c for c in manifest.columns if c.startswith(SUBTYPE_PREFIX)]
+    contents = {}
+    for rec in manifest[["fname"] + subtype_cols].itertuples(index=False):
+        key = seed_key(rec[0])
+        if key in values:
+            contents[key] = sorted(c[len(SUBTYPE_PREFIX):] for c, n in zip(subtype_cols, rec[1:]) if n > 0)
+
+    by_subtype, by_pair = {}, {}
+    for key, subtypes in contents.items():
+        for subtype in subtypes:
+            by_subtype.setdefault(subtype, []).append(key)
+        for pair in itertools.combinations(subtypes, 2):
+            by_pair.setdefault("+".join(pair), []).append(key)
+    by_pair = {pair: keys for pair, keys in by_pair.items() if len(keys) >= min_pair_seeds}
+
+    return {
+        "subtypes": shrunk_weights(by_subtype, values, mean, prior),
+        "pairs": shrunk_weights(by_pair, values, mean, prior),
+        "seeds": len(values),
+        "functions": n_functions,
+    }
+
+
+def main():
+    args = parse_args()
+    coverage = read_coverage(args.coverage)
+    manifest = read_manifest(args.manifest)
+    try:
+        weights = learn_weights(coverage, manifest, args.prior, args.min_pair_seeds)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    with open(args.out, "w") as fh:
+        json.dump(weights, fh, indent=1, sort_keys=True)
+    ranked = sorted(weights["subtypes"].items(), key=lambda kv: -kv[1])
+    print(f"Learned weights of {len(ranked)} subtypes and {len(weights['pairs'])} pairs "
+          f"from {weights['seeds']} seeds and {weights['functions']} covered functions -> {args.out}")
+    for subtype, w in ranked:
+        print(f"  {subtype:<16} {w:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Shared driver for the seed generators (gen1.py, gen2.py).
+
+Generation is driven by a count, a master seed and an optional shard: file
+`index` always draws from its own random stream derived from
+(master seed, index), so a single file can be regenerated on its own and
+a large corpus can be split across processes and machines.
+
+Size budgets (--max-bytes, --target-size-distribution) and subtype weights
+learned from coverage (--weights, see coverage_analysis/weights.py) are
+handed to the workers with every job. With --class-quota every index is
+assigned a seed class (see seedclass.py) up front, so the corpus has
+exactly the requested mix, whatever the sharding.
+"""
+
+import os
+import re
+import sys
+import json
+import random
+import argparse
+from multiprocessing import Pool
+
+from sink import ZIP_COMPRESSION, open_sink, sink_kind
+from seedclass import CLASSES, DEFAULT_RANGES, REQUIRED_KINDS
+
+SIZE_WARNING = 10 * 1024
+SUBTYPE_RE = re.compile(r"/Subtype\s*/(\w+)")
+
+
+def seed_rng(master_seed, index):
+    """Return the random stream of file `index` under `master_seed`."""
+    return random.Random(f"{master_seed}:{index}")
+
+
+def add_batch_args(p, out_dir, count=50):
+    """Add the count/seed/shard/worker/output options to an ArgumentParser."""
+    p.add_argument("--count", type=int, default=count, help=f"total number of PDFs (default: {count})")
+    p.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="master seed; file i always comes out the same for a given seed "
+        "(default: a random one, printed so the run can be reproduced)",
+    )
+    p.add_argument(
+        "--shard-index", type=int, default=0, help="which shard of the indices to generate (default: 0)"
+    )
+    p.add_argument(
+        "--shard-count", type=int, default=1, help="number of shards the indices are split into (default: 1)"
+    )
+    p.add_argument(
+        "--index",
+        type=int,
+        action="append",
+        default=[],
+        help="only (re)generate this file index (repeatable)",
+    )
+    p.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=0,
+        help="number of worker processes (default: 0 = one per CPU)",
+    )
+    p.add_argument(
+        "--max-bytes",
+        type=parse_size,
+        default=None,
+        help="size budget of every seed (e.g. 4096 or 4k); documents are trimmed or "
+        "filled while they are built to land just under it",
+    )
+    p.add_argument(
+        "--target-size-distribution",
+        type=parse_size_distribution,
+        default=None,
+        metavar="SIZE:WEIGHT,...",
+        help="draw each seed's size budget from this weighted distribution "
+        "(e.g. 1k:2,4k:1); combined with --max-bytes the smaller one applies",
+    )
+    p.add_argument(
+        "--weights",
+        default=None,
+        help="JSON of per-subtype (and subtype-pair) weights written by "
+        "coverage_analysis/weights.py; annotations are drawn in proportion to them",
+    )
+    p.add_argument(
+        "--class-quota",
+        type=parse_class_quota,
+        default=None,
+        metavar="CLASS=N,...",
+        help="generate this mix of seed classes (" + ", ".join(CLASSES) + "); the "
+        "numbers are scaled to --count, e.g. only_annots=55,only_widgets=6,both=138,neither=1",
+    )
+    p.add_argument(
+        "--class-range",
+        type=parse_class_range,
+        action="append",
+        default=[],
+        metavar="CLASS=LO:HI",
+        help="number of /Annots entries of the seeds of a class (repeatable; defaults: "
+        + ", ".join(f"{c}={lo}:{hi}" for c, (lo, hi) in DEFAULT_RANGES.items())
+        + ")",
+    )
+    p.add_argument(
+        "-o",
+        "--out",
+        "--out-dir",
+        dest="out",
+        default=out_dir,
+        help="output: a directory, a .zip or .tar[.gz] archive, or - for length-prefixed "
+        f"records on stdout (default: {out_dir})",
+    )
+    p.add_argument(
+        "--zip-compression",
+        choices=sorted(ZIP_COMPRESSION),
+        default="stored",
+        help="compression of zip output (default: stored)",
+    )
+
+
+def parse_size(text):
+    """Parse a byte count such as 4096, 4k or 1.5M."""
+    text = text.strip().lower().rstrip("b")
+    scale = {"k": 1024, "m": 1024 * 1024}.get(text[-1:], 1)
+    try:
+        value = int(float(text[:-1] if scale > 1 else text) * scale)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r}")
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"size must be positive: {text!r}")
+    return value
+
+
+def parse_size_distribution(text):
+    """Parse 'SIZE:WEIGHT,...' into a list of (size, weight)."""
+    dist = []
+    for part in text.split(","):
+        size, _, weight = part.partition(":")
+        try:
+            dist.append((parse_size(size), float(weight or 1)))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight in {part!r}")
+    if not dist or sum(w for _, w in dist) <= 0:
+        raise argparse.ArgumentTypeError("the distribution needs a positive total weight")
+    return dist
+
+
+def parse_class_quota(text):
+    """Parse 'CLASS=N,...' into {class: weight}."""
+    quota = {}
+    for part in text.split(","):
+        name, _, n = part.partition("=")
+        if name not in CLASSES:
+            raise argparse.ArgumentTypeError(f"unknown class {name!r} (choose from {', '.join(CLASSES)})")
+        try:
+            quota[name] = float(n)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid quota in {part!r}")
+    if sum(quota.values()) <= 0 or min(quota.values()) < 0:
+        raise argparse.ArgumentTypeError("class quotas must be non-negative with a positive total")
+    return quota
+
+
+def parse_class_range(text):
+    """Parse 'CLASS=LO:HI' into (class, (lo, hi))."""
+    name, _, bounds = text.partition("=")
+    if name not in CLASSES:
+        raise argparse.ArgumentTypeError(f"unknown class {name!r} (choose from {', '.join(CLASSES)})")
+    lo, _, hi = bounds.partition(":")
+    try:
+        lo, hi = int(lo), int(hi or lo)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid range in {text!r}")
+    if not len(REQUIRED_KINDS[name]) <= lo <= hi:
+        raise argparse.ArgumentTypeError(
+            f"{name} needs {len(REQUIRED_KINDS[name])} <= LO <= HI, got {lo}:{hi}"
+        )
+    return name, (lo, hi)
+
+
+def class_plan(master_seed, count, quota):
+    """
+    Return the class of every index 1..count (as a list, index - 1): the
+    quotas are scaled to count with largest remainders and the classes are
+    spread over the indices by a shuffle seeded with master_seed.
+    """
+    total = sum(quota.values())
+    exact = {c: q * count / total for c, q in quota.items()}
+    counts = {c: int(x) for c, x in exact.items()}
+    by_remainder = sorted(quota, key=lambda c: exact[c] - counts[c], reverse=True)
+    for c in by_remainder[: count - sum(counts.values())]:
+        counts[c] += 1
+    plan = [c for c in CLASSES if c in counts for _ in range(counts[c])]
+    random.Random(f"{master_seed}:classes").shuffle(plan)
+    return plan
+
+
+def load_weights(path):
+    """Read a weights JSON; missing sections are empty (every weight defaults to 1)."""
+    with open(path) as fh:
+        weights = json.load(fh)
+    return {"subtypes": weights.get("subtypes", {}), "pairs": weights.get("pairs", {})}
+
+
+def template_subtype(template):
+    """The /Subtype name of an annotation template, or ''."""
+    m = SUBTYPE_RE.search(template)
+    return m.group(1) if m else ""
+
+
+def subtype_weight(weights, subtype, others=()):
+    """
+    Weight of drawing an annotation of subtype next to the subtypes in
+    others: its own weight times the mean weight of the pairs it forms.
+    """
+    w = weights["subtypes"].get(subtype, 1.0)
+    if others:
+        pairs = weights["pairs"]
+        w *= sum(pairs.get("+".join(sorted((subtype, o))), 1.0) for o in others) / len(others)
+    return w
+
+
+def job_options(args):
+    """The size-budget, weight and class options a worker needs, as a small picklable dict."""
+    return {
+        "max_bytes": args.max_bytes,
+        "sizes": args.target_size_distribution,
+        "weights": load_weights(args.weights) if args.weights else None,
+        "class_ranges": dict(DEFAULT_RANGES, **dict(args.class_range)),
+        "seed_class": None,
+    }
+
+
+def pick_budget(master_seed, index, options):
+    """
+    Return the size budget of file `index`, or None when none was asked for.
+    A distribution is sampled from a stream of its own, so the document's
+    own draws are the same with or without a budget.
+    """
+    budget = options["max_bytes"]
+    if options["sizes"]:
+        sizes, weights = zip(*options["sizes"])
+        target = random.Random(f"{master_seed}:{index}:size").choices(sizes, weights)[0]
+        budget = min(target, budget) if budget else target
+    return budget
+
+
+def check_batch_args(p, args):
+    """Validate the options added by add_batch_args()."""
+    if not 0 <= args.shard_index < args.shard_count:
+        p.error("--shard-index must be in [0, --shard-count)")
+    if args.class_range and not args.class_quota:
+        p.error("--class-range needs --class-quota")
+    if args.class_quota and any(not 1 <= i <= args.count for i in args.index):
+        p.error("with --class-quota every --index must be in [1, --count]")
+
+
+def shard_indices(count, shard_index, shard_count):
+    """File indices 1..count that belong to the given shard."""
+    return range(1 + shard_index, count + 1, shard_count)
+
+
+def run_batch(args, generate, name_format, extra_options=None):
+    """
+    Generate the files selected by args in a process pool and write them to
+    the args.out sink from this process, in job order whatever the number
+    of workers. generate((master_seed, index,
+    options)) must be a module-level function returning (index, pdf bytes),
+    where options are job_options() (see pick_budget(); seed_class is the
+    index's class under --class-quota, otherwise None) plus any
+    generator-specific extra_options; name_format is formatted with the
+    index to give each file name.
+    """
+    # with records on stdout, all messages go to stderr
+    log = sys.stderr if sink_kind(args.out) == "stdout" else sys.stdout
+    master_seed = args.seed if args.seed is not None else random.randrange(2**32)
+    indices = args.index or shard_indices(args.count, args.shard_index, args.shard_count)
+    options = dict(job_options(args), **(extra_options or {}))
+    jobs = [(master_seed, i, options) for i in indices]
+    if args.class_quota:
+        plan = class_plan(master_seed, args.count, args.class_quota)
+        jobs = [(master_seed, i, dict(options, seed_class=plan[i - 1])) for i in indices]
+    print(f"Master seed {master_seed}: generating {len(jobs)} files", file=sys.stderr)
+
+    sink = open_sink(args.out, args.zip_compression)
+    workers = args.workers or os.cpu_count() or 1
+    chunksize = max(1, len(jobs) // (workers * 8))
+    try:
+        with Pool(workers) as pool:
+            for i, pdf_data in pool.imap(generate, jobs, chunksize=chunksize):
+                name = name_format.format(i)
+                sink.add(name, pdf_data)
+                # seeds over their budget (or 10KB without one) are reported
+                if len(pdf_data) > (pick_budget(master_seed, i, options) or SIZE_WARNING - 1):
+                    print(f"Warning: {sink.describe(name)} size is {len(pdf_data)} bytes.", file=log)
+    finally:
+        sink.close()
+    print(f"Generated {len(jobs)} different PDF files in {sink.where}.", file=log)
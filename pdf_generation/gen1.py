@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-This script generates 100 different PDF files whose structure is deliberately varied
+This script generates --count (50 by default) different PDF files whose structure is deliberately varied
 in order to create a highly diverse seed corpus for a PDF library fuzzing harness.
 The variations include:
   - A random number of pages (1 to 5) per PDF.
@@ -9,54 +9,91 @@ The variations include:
   - Additional dictionary keys in annotations (e.g., color and border).
   - Alternate PDF versions.
   - Variation in the cross-reference mechanism and trailer dictionaries.
+  - Optionally (--xref stream, --objstm, --flate) a PDF 1.5 cross-reference
+    stream, annotations packed in per-page /ObjStm object streams and Flate
+    compression of those streams.
   - Occasional small deviations (e.g. off-by-one values).
 Each PDF is generated as a minimal document and is kept relatively small.
+
+Every file draws from its own random stream derived from (master seed, index),
+so any file can be regenerated on its own and the work can be split into
+shards across processes and machines.
 """
 
-import os
-import random
 import string
+import argparse
+from functools import lru_cache
+
+from pdfbytes import GEN_HEADER, PdfByteWriter, object_size, template_bytes, xref_size
+from seedclass import REQUIRED_KINDS, ALLOWED_KINDS, plan_kinds, subtype_kind
+from batch import (
+    seed_rng,
+    pick_budget,
+    subtype_weight,
+    template_subtype,
+    add_batch_args,
+    check_batch_args,
+    run_batch,
+)
+
+OUT_DIR = "pdf_outputs_1"
 
 # --------------------------
 # Helper functions
 # --------------------------
 
-def random_string(n=10):
+def random_string(rng, n=10):
     """Generate a random alphanumeric string of length n."""
-    return "".join(random.choices(string.ascii_letters + string.digits, k=n))
+    return "".join(rng.choices(string.ascii_letters + string.digits, k=n))
 
-def random_rect():
+def random_rect(rng):
     """Generate a random rectangle [llx lly urx ury] ensuring llx < urx and lly < ury."""
-    llx = round(random.uniform(0, 400), 2)
-    lly = round(random.uniform(0, 600), 2)
-    urx = round(random.uniform(llx + 1, 612), 2)
-    ury = round(random.uniform(lly + 1, 792), 2)
+    llx = round(rng.uniform(0, 400), 2)
+    lly = round(rng.uniform(0, 600), 2)
+    urx = round(rng.uniform(llx + 1, 612), 2)
+    ury = round(rng.uniform(lly + 1, 792), 2)
     return f"[{llx} {lly} {urx} {ury}]"
 
-def random_color():
+def random_color(rng):
     """Generate a random RGB array for PDF (each component between 0 and 1)."""
-    r = round(random.uniform(0, 1), 2)
-    g = round(random.uniform(0, 1), 2)
-    b = round(random.uniform(0, 1), 2)
+    r = round(rng.uniform(0, 1), 2)
+    g = round(rng.uniform(0, 1), 2)
+    b = round(rng.uniform(0, 1), 2)
     return f"[{r} {g} {b}]"
 
-def build_annotation(template):
+RECT_PLACEHOLDER = "[50 750 70 770]"
+TABLE_LAYOUT = {"xref": "table", "objstm": False, "flate": False}
+# Upper bound of what one more annotation adds to a file (object, reference, xref entry)
+ANNOT_COST = 320
+
+@lru_cache(maxsize=None)
+def split_template(template):
+    """
+    Pre-encode an annotation template around its placeholder rectangle:
+    returns (head, tail) so that head + rect + tail is the template with the
+    rectangle replaced and the closing ' >>' stripped, ready for extra keys.
+    Templates without a placeholder get a /Rect appended instead.
+    """
+    if RECT_PLACEHOLDER in template:
+        head, tail = template.split(RECT_PLACEHOLDER, 1)
+        return head.encode("utf-8"), tail.rstrip(" >>").encode("utf-8")
+    return template.rstrip(" >>").encode("utf-8") + b" /Rect ", b""
+
+def build_annotation(rng, template):
     """
     Build an annotation by randomizing coordinates, text, and adding extra keys.
     The original template (which may include a placeholder rectangle) is modified.
+    Returns the annotation dictionary as bytes.
     """
-    rect = random_rect()
-    contents = random_string(15)
-    color = random_color()
-    border = f"[{random.randint(0,3)} {random.randint(0,3)} {random.randint(1,10)}]"
+    rect = random_rect(rng)
+    contents = random_string(rng, 15)
+    color = random_color(rng)
+    border = f"[{rng.randint(0,3)} {rng.randint(0,3)} {rng.randint(1,10)}]"
     # If the template contains a placeholder rectangle, replace it; otherwise, inject one.
-    if "[50 750 70 770]" in template:
-        annot = template.replace("[50 750 70 770]", rect)
-    else:
-        annot = template.rstrip(" >>") + f" /Rect {rect}"
+    head, tail = split_template(template)
     # Append additional dictionary keys: /C for color, /Border, and override /Contents.
-    annot = annot.rstrip(" >>") + f" /C {color} /Border {border} /Contents ({contents}) >>"
-    return annot
+    extra = f" /C {color} /Border {border} /Contents ({contents}) >>"
+    return head + rect.encode() + tail + extra.encode()
 
 # --------------------------
 # Master annotation templates
@@ -70,62 +107,97 @@ annotation_templates = [
     "<< /Type/Annot /Subtype /Widget /Rect [50 750 70 770] /Contents (Widget Annotation) >>",
 ]
 
+TEMPLATE_SUBTYPES = [template_subtype(t) for t in annotation_templates]
+TEMPLATES_BY_KIND = {}
+for template, subtype in zip(annotation_templates, TEMPLATE_SUBTYPES):
+    TEMPLATES_BY_KIND.setdefault(subtype_kind(subtype), []).append((template, subtype))
+
+def choose_template(rng, weights=None, on_page=(), kind=None):
+    """
+    Pick an annotation template, of the given kind (see seedclass.py) if
+    one is given: uniformly, or in proportion to the learned subtype weights
+    combined with the pair weights of the subtypes already on the page.
+    """
+    if kind is None:
+        if weights is None:
+            return rng.choice(annotation_templates)
+        candidates = list(zip(annotation_templates, TEMPLATE_SUBTYPES))
+    else:
+        candidates = TEMPLATES_BY_KIND[kind]
+    if weights is None:
+        return rng.choice(candidates)[0]
+    w = [subtype_weight(weights, subtype, on_page) for _, subtype in candidates]
+    return rng.choices(candidates, w)[0][0]
+
 # --------------------------
 # Build PDF with all the introduced variations.
 # --------------------------
-def build_pdf():
-    # Choose a random PDF version.
-    pdf_version = random.choice(["1.4", "1.5", "1.7"])
-    objects = []  # List of tuples: (object number, object content)
-    
+def draw_page(rng, weights=None, kinds=None):
+    """
+    Draw one page: its content stream, Length deviation, annotations and
+    extra key. kinds fixes the number and kinds of the annotations (class
+    mode), otherwise there are 1 to 5 of any kind.
+    """
+    # --- Content Stream ---
+    stream_bytes = random_string(rng, 20).encode("utf-8")
+    # Possibly tweak the declared stream length by ±1.
+    deviation = rng.choice([-1, 1]) if rng.random() < 0.2 else 0
+
+    # --- Annotations for this page ---
+    if kinds is None:
+        n_annots = rng.randint(1, 5)
+        kinds = [None] * n_annots
+    annots = []
+    on_page = []
+    for kind in kinds:
+        annot_template = choose_template(rng, weights, on_page, kind)
+        annots.append(build_annotation(rng, annot_template))
+        on_page.append(template_subtype(annot_template))
+
+    extra_key = ""
+    if rng.random() < 0.3:
+        extra_key = f" /Modified ({random_string(rng, 8)})"
+    return {"stream": stream_bytes, "deviation": deviation, "annots": annots, "extra": extra_key}
+
+def content_body(page):
+    stream_bytes = page["stream"]
+    declared_length = len(stream_bytes) + page["deviation"]
+    return b"<< /Length %d >>\nstream\n%s\nendstream" % (declared_length, stream_bytes)
+
+def assemble(pages, dummies):
+    """
+    Number the drawn pages and dummy objects. Returns (objects, total_objects,
+    annot_groups) where objects is a list of (object number, encoded object
+    body) and annot_groups lists the annotation object numbers of each page.
+    """
+    objects = []
     # We'll assign fixed numbers to the Catalog and Pages objects.
     # Catalog (object 1) always points to Pages (object 2).
-    catalog_obj = (1, "1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
-    objects.append(catalog_obj)
+    objects.append((1, b"<< /Type /Catalog /Pages 2 0 R >>"))
 
     pages_obj_num = 2  # reserved for the Pages object.
     current_obj = 3    # Next object number to assign.
-    
-    # Create a random number of pages (between 1 and 5).
-    num_pages = random.randint(1, 5)
     page_obj_nums = []  # To remember which object numbers are pages.
+    annot_groups = []
 
-    for p in range(num_pages):
-        # --- Content Stream ---
-        stream_text = random_string(20)
-        stream_bytes = stream_text.encode("utf-8")
-        stream_length = len(stream_bytes)
-        # Possibly tweak the declared stream length by ±1.
-        if random.random() < 0.2:
-            deviation_val = random.choice([-1, 1])
-            declared_length = stream_length + deviation_val
-        else:
-            declared_length = stream_length
+    for page in pages:
         content_obj_num = current_obj
-        content_obj = (current_obj,
-                       f"{current_obj} 0 obj\n<< /Length {declared_length} >>\nstream\n{stream_text}\nendstream\nendobj\n")
-        objects.append(content_obj)
+        objects.append((current_obj, content_body(page)))
         current_obj += 1
 
-        # --- Annotations for this page ---
-        n_annots = random.randint(1, 5)
         annot_obj_nums = []
-        for i in range(n_annots):
-            annot_template = random.choice(annotation_templates)
-            annot = build_annotation(annot_template)
-            annot_obj = (current_obj, f"{current_obj} 0 obj\n{annot}\nendobj\n")
-            objects.append(annot_obj)
+        for annot in page["annots"]:
+            objects.append((current_obj, annot))
             annot_obj_nums.append(current_obj)
             current_obj += 1
 
+        annot_groups.append(annot_obj_nums)
+
         # --- Page Object ---
         annot_refs = " ".join(f"{num} 0 R" for num in annot_obj_nums)
-        extra_key = ""
-        if random.random() < 0.3:
-            extra_key = f" /Modified ({random_string(8)})"
         page_obj = (current_obj,
-                    f"{current_obj} 0 obj\n<< /Type /Page /Parent {pages_obj_num} 0 R "
-                    f"/MediaBox [0 0 612 792] /Contents {content_obj_num} 0 R /Annots [{annot_refs}]{extra_key} >>\nendobj\n")
+                    f"<< /Type /Page /Parent {pages_obj_num} 0 R "
+                    f"/MediaBox [0 0 612 792] /Contents {content_obj_num} 0 R /Annots [{annot_refs}]{page['extra']} >>".encode())
         objects.append(page_obj)
         page_obj_nums.append(current_obj)
         current_obj += 1
@@ -133,76 +205,238 @@ def build_pdf():
     # --- Pages Object ---
     kids_array = " ".join(f"{num} 0 R" for num in page_obj_nums)
     pages_obj = (pages_obj_num,
-                 f"{pages_obj_num} 0 obj\n<< /Type /Pages /Count {num_pages} /Kids [{kids_array}] >>\nendobj\n")
+                 f"<< /Type /Pages /Count {len(pages)} /Kids [{kids_array}] >>".encode())
     objects.append(pages_obj)
 
     # --- Dummy Objects ---
-    dummy_count = random.randint(0, 5)
-    for i in range(dummy_count):
-        dummy_obj = (current_obj,
-                     f"{current_obj} 0 obj\n<< /Type /Dummy /Data ({random_string(10)}) >>\nendobj\n")
-        objects.append(dummy_obj)
+    for data in dummies:
+        objects.append((current_obj, b"<< /Type /Dummy /Data (%s) >>" % data))
         current_obj += 1
 
-    total_objects = current_obj - 1  # Highest object number
+    return objects, current_obj - 1, annot_groups
 
-    # --- Randomize object order ---
-    # (Note: the cross-reference table does not care about file order, only object numbers and offsets.)
-    random.shuffle(objects)
+def trailer_bytes(total_objects, info, xref_stm, startxref_value):
+    trailer_dict = f"<< /Size {total_objects + 1} /Root 1 0 R"
+    if info is not None:
+        trailer_dict += f" /Info ({info})"
+    if xref_stm is not None:
+        trailer_dict += f" /XRefStm {xref_stm}"
+    trailer_dict += " >>"
+    return f"trailer\n{trailer_dict}\nstartxref\n{startxref_value}\n%%EOF\n".encode()
+
+def predicted_size(header, assembled, budget, layout=TABLE_LAYOUT):
+    """
+    Serialized size of the assembled objects, with the largest trailer the
+    later draws can produce (both optional keys, a startxref as long as the
+    budget), so a document that fits here fits once written. Stream layouts
+    are measured by writing them in object order, as their size does not
+    depend on the order.
+    """
+    objects, total_objects, annot_groups = assembled
+    worst_trailer = ("x" * 12, 999, 0)
+    if layout != TABLE_LAYOUT:
+        order = range(len(objects))
+        return len(write_pdf(header, assembled, order, worst_trailer, layout))
+    size = len(header) + xref_size(total_objects + 1)
+    size += sum(object_size(num, len(body)) for num, body in objects)
+    return size + len(trailer_bytes(total_objects, *worst_trailer[:2], budget))
+
+def fit_budget(rng, header, pages, dummies, budget, layout, weights=None, seed_class=None, max_annots=None):
+    """
+    Trim or fill the drawn document in place so that its predicted size is
+    within budget. Trimming drops dummy objects, then annotations beyond the
+    ones a page keeps (one, or the kinds its class requires), then pages
+    beyond the first, then content stream text; filling adds annotations
+    (drawn with the subtype weights, of the kinds seed_class allows, up to
+    max_annots in all) to random pages while they fit.
+    """
+    def excess():
+        return predicted_size(header, assemble(pages, dummies), budget, layout) - budget
+
+    over = excess()
+    while over > 0 and dummies:
+        dummies.pop()
+        over = excess()
+    while over > 0:
+        page = max(pages, key=lambda pg: len(pg["annots"]) - pg.get("keep", 1))
+        if len(page["annots"]) <= page.get("keep", 1):
+            break
+        page["annots"].pop()
+        over = excess()
+    while over > 0 and len(pages) > 1:
+        pages.pop()
+        over = excess()
+    if over > 0:
+        page = pages[0]
+        page["stream"] = page["stream"][: max(0, len(page["stream"]) - over)]
+        return
+
+    # Filling is done in batches of about half the remaining room, so the
+    # exact size is only recomputed a logarithmic number of times.
+    added = []
+    room = float("inf") if max_annots is None else max_annots - sum(len(pg["annots"]) for pg in pages)
+    fill_kinds = ALLOWED_KINDS[seed_class] if seed_class else [None]
+    while over <= 0 and room > 0:
+        batch = min(room, max(1, -over // (2 * ANNOT_COST)))
+        for i in range(batch):
+            page = rng.choice(pages)
+            kind = rng.choice(fill_kinds) if seed_class else None
+            page["annots"].append(build_annotation(rng, choose_template(rng, weights, kind=kind)))
+            added.append(page)
+        room -= batch
+        over = excess()
+    while over > 0 and added:
+        added.pop()["annots"].pop()
+        over = excess()
+
+def write_pdf(header, assembled, order, trailer_draws, layout=TABLE_LAYOUT):
+    """
+    Write the objects in the given order followed by the cross-reference
+    section and trailer of the layout. With object streams each page's
+    annotations go into an /ObjStm written after the other objects.
+    """
+    objects, total_objects, annot_groups = assembled
+    info, xref_stm, startxref_delta = trailer_draws
+    packed = layout["objstm"] and [group for group in annot_groups if group]
+    bodies = dict(objects) if packed else None
+    in_streams = {num for group in packed or () for num in group}
 
     # --- Build the PDF file ---
-    header = f"%PDF-{pdf_version}\n%âãÏÓ\n"
-    pdf_body = ""
-    # We need to record the file offset of each object number.
-    obj_offsets = {}
-    current_offset = len(header.encode("utf-8"))
-    for obj_num, content in objects:
-        obj_offsets[obj_num] = current_offset
-        pdf_body += content
-        current_offset += len(content.encode("utf-8"))
-    pdf_without_xref = header + pdf_body
-
-    # --- Build cross-reference section ---
-    # Create a xref table that lists objects sorted by their object number.
-    xref_entries = []
-    xref_entries.append("0000000000 65535 f \n")  # Object 0 entry
-    for i in range(1, total_objects + 1):
-        offset = obj_offsets.get(i, 0)
-        xref_entries.append(f"{offset:010d} 00000 n \n")
-    xref_table = "xref\n0 {}\n{}".format(total_objects + 1, "".join(xref_entries))
+    # The writer records the file offset of each object number as it goes.
+    writer = PdfByteWriter(header)
+    for i in order:
+        if objects[i][0] not in in_streams:
+            writer.add_object(*objects[i])
+
+    if layout["xref"] == "table":
+        # --- Build cross-reference section ---
+        # Create a xref table that lists objects sorted by their object number.
+        xref_offset = writer.write_xref(total_objects + 1)
+
+        # --- startxref and final EOF ---
+        writer.write(trailer_bytes(total_objects, info, xref_stm, xref_offset + startxref_delta))
+        return writer.getvalue()
+
+    # --- Object streams and cross-reference stream ---
+    # These take the numbers after the document's own objects; /XRefStm is
+    # meaningless without a classic table and is left out.
+    num = total_objects + 1
+    for group in packed or ():
+        writer.add_object_stream(num, [(n, bodies[n]) for n in group], layout["flate"])
+        num += 1
+    entries = b"/Root 1 0 R"
+    if info is not None:
+        entries += b" /Info (%s)" % info.encode()
+    xref_offset = writer.write_xref_stream(num, num + 1, entries, layout["flate"])
+    writer.write(b"startxref\n%d\n%%%%EOF\n" % (xref_offset + startxref_delta))
+    return writer.getvalue()
+
+def build_pdf(rng, budget=None, layout=TABLE_LAYOUT, weights=None, seed_class=None, annot_range=None):
+    """
+    Build one document. With a budget (bytes) the drawn document is trimmed
+    or filled before it is written, and the first page's content stream is
+    padded so the file lands just under the budget. layout selects the
+    cross-reference table or stream, object streams and Flate compression;
+    weights (see batch.load_weights) bias the annotation subtypes. With a
+    seed_class the document gets annot_range[0]..annot_range[1] annotations
+    of the kinds that make sum.py put it in that class.
+    """
+    # Choose a random PDF version (at least 1.5 for cross-reference streams).
+    pdf_version = rng.choice(["1.4", "1.5", "1.7"])
+    if layout["xref"] == "stream" and pdf_version == "1.4":
+        pdf_version = "1.5"
+    header = template_bytes(GEN_HEADER.format(pdf_version))
+
+    # Create a random number of pages (between 1 and 5).
+    num_pages = rng.randint(1, 5)
+    if seed_class is None:
+        pages = [draw_page(rng, weights) for p in range(num_pages)]
+    else:
+        # The kinds the class requires go first on the first page, which
+        # keeps them when a budget trims the document.
+        kinds = plan_kinds(rng, seed_class, rng.randint(*annot_range))
+        required = len(REQUIRED_KINDS[seed_class])
+        page_kinds = [kinds[:required]] + [[] for p in range(num_pages - 1)]
+        for kind in kinds[required:]:
+            page_kinds[rng.randrange(num_pages)].append(kind)
+        pages = [draw_page(rng, weights, page_kinds[p]) for p in range(num_pages)]
+        for p, page in enumerate(pages):
+            page["keep"] = required if p == 0 else 0
+
+    # --- Dummy Objects ---
+    dummy_count = rng.randint(0, 5)
+    dummies = [random_string(rng, 10).encode() for i in range(dummy_count)]
+
+    if budget:
+        max_annots = annot_range[1] if seed_class else None
+        fit_budget(rng, header, pages, dummies, budget, layout, weights, seed_class, max_annots)
+    assembled = assemble(pages, dummies)
+
+    # --- Randomize object order ---
+    # (Note: the cross-reference table does not care about file order, only object numbers and offsets.)
+    order = list(range(len(assembled[0])))
+    rng.shuffle(order)
 
     # --- Build variable trailer dictionary ---
-    trailer_dict = f"<< /Size {total_objects + 1} /Root 1 0 R"
-    if random.random() < 0.5:
-        trailer_dict += f" /Info ({random_string(12)})"
-    if random.choice([True, False]):
-        trailer_dict += f" /XRefStm {random.randint(100, 999)}"
-    trailer_dict += " >>"
-    trailer = f"trailer\n{trailer_dict}\n"
+    info = random_string(rng, 12) if rng.random() < 0.5 else None
+    xref_stm = rng.randint(100, 999) if rng.choice([True, False]) else None
+    startxref_delta = rng.choice([-1, 1]) if rng.random() < 0.3 else 0
+    trailer_draws = (info, xref_stm, startxref_delta)
 
-    # --- startxref and final EOF ---
-    startxref_value = len(pdf_without_xref.encode("utf-8"))
-    if random.random() < 0.3:
-        startxref_value += random.choice([-1, 1])
-    startxref = f"startxref\n{startxref_value}\n"
-    eof = "%%EOF\n"
+    pdf = write_pdf(header, assembled, order, trailer_draws, layout)
+    if not budget or len(pdf) == budget:
+        return pdf
 
-    pdf_complete = pdf_without_xref + xref_table + trailer + startxref + eof
-    return pdf_complete.encode("utf-8")
+    # Pad (or, when the compressed streams came out a little larger than
+    # predicted, shorten) the first content stream; its /Length and the
+    # startxref value may change length too, so correct by any overshoot.
+    first = pages[0]
+    stream = first["stream"] + random_string(rng, max(0, budget - len(pdf))).encode()
+    n = len(first["stream"]) + budget - len(pdf)
+    while n >= 0:
+        adjusted = dict(first, stream=stream[:n])
+        assembled = assemble([adjusted] + pages[1:], dummies)
+        candidate = write_pdf(header, assembled, order, trailer_draws, layout)
+        if len(candidate) <= budget:
+            return candidate
+        n -= len(candidate) - budget
+    return pdf
 
 # --------------------------
-# Main: generate 100 PDFs
+# Main: generate --count PDFs
 # --------------------------
+def parse_args():
+    p = argparse.ArgumentParser(description="Generate structurally varied PDFs with annotations.")
+    add_batch_args(p, OUT_DIR)
+    p.add_argument(
+        "--xref",
+        choices=["table", "stream"],
+        default="table",
+        help="classic cross-reference table or PDF 1.5 cross-reference stream (default: table)",
+    )
+    p.add_argument(
+        "--objstm", action="store_true", help="pack each page's annotations in an /ObjStm (needs --xref stream)"
+    )
+    p.add_argument("--flate", action="store_true", help="Flate-compress the object and cross-reference streams")
+    args = p.parse_args()
+    check_batch_args(p, args)
+    if (args.objstm or args.flate) and args.xref != "stream":
+        p.error("--objstm and --flate need --xref stream")
+    return args
+
+def generate(job):
+    """Worker: build file `index` of `master_seed`; returns (index, pdf bytes)."""
+    master_seed, index, options = job
+    budget = pick_budget(master_seed, index, options)
+    rng = seed_rng(master_seed, index)
+    seed_class = options["seed_class"]
+    annot_range = options["class_ranges"][seed_class] if seed_class else None
+    return index, build_pdf(rng, budget, options["layout"], options["weights"], seed_class, annot_range)
+
 def main():
-    os.makedirs("pdf_outputs_1", exist_ok=True)
-    for i in range(1, 51):
-        pdf_data = build_pdf()
-        filename = os.path.join("pdf_outputs_1", f"generated_1_{i}.pdf")
-        with open(filename, "wb") as f:
-            f.write(pdf_data)
-        if len(pdf_data) >= 10 * 1024:
-            print(f"Warning: {filename} size is {len(pdf_data)} bytes.")
-    print("Generated 100 different PDF files in the 'pdf_outputs_1' directory.")
+    args = parse_args()
+    layout = {"xref": args.xref, "objstm": args.objstm, "flate": args.flate}
+    run_batch(args, generate, "generated_1_{}.pdf", {"layout": layout})
 
 if __name__ == "__main__":
     main()
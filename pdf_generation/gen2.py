@@ -1,16 +1,23 @@
 #!/usr/bin/env python3
 """
-This script generates 100 different PDF files that use a varying subset
+This script generates --count (50 by default) different PDF files that use a varying subset
 (and ordering) of annotation types. The master list of annotations includes:
 Text, Link, FreeText, Line, Square, Circle, Polygon, PolyLine, Highlight, Underline,
 Squiggly, StrikeOut, Stamp, Caret, Ink, Popup, FileAttachment, Sound, Movie, Widget,
 Screen, PrinterMark, TrapNet, Watermark, 3D, and Redact. For each generated PDF,
 a random subset (minimum 5 annotations) in a random order is chosen.
 Each PDF file is generated as a minimal one‑page document and is less than 10 KB.
+Every file draws from its own random stream derived from (master seed, index),
+see batch.py.
 """
 
-import os
-import random
+import argparse
+
+from pdfbytes import GEN_HEADER, PdfByteWriter, object_size, template_bytes, xref_size
+from seedclass import REQUIRED_KINDS, ALLOWED_KINDS, subtype_kind
+from batch import seed_rng, pick_budget, subtype_weight, template_subtype, add_batch_args, check_batch_args, run_batch
+
+OUT_DIR = "pdf_outputs_2"
 
 # Master list of annotation definitions (each is a minimal PDF dictionary)
 annotation_objects = [
@@ -68,82 +75,180 @@ annotation_objects = [
     "<< /Type/Annot /Subtype /Redact /Rect [260 600 300 620] /Contents (Redact Annotation) >>"
 ]
 
-def build_pdf(annotations):
+# The page's content stream is fixed (you could also vary it)
+CONTENT = b"BT /F1 12 Tf 100 700 Td (File variation) Tj ET"
+
+def build_pdf(annotations, content=CONTENT):
     """
     Build a minimal one-page PDF with the provided list of annotation strings.
     Returns the complete PDF as a bytes object.
     """
-    objects = []
+    writer = PdfByteWriter(template_bytes(GEN_HEADER.format("1.4")))
 
     # Object 1: Catalog
-    objects.append("1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+    writer.add_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
 
     # Object 2: Pages
-    objects.append("2 0 obj\n<< /Type /Pages /Count 1 /Kids [3 0 R] >>\nendobj\n")
+    writer.add_object(2, b"<< /Type /Pages /Count 1 /Kids [3 0 R] >>")
 
     # Create references for the annotation objects.
     annot_count = len(annotations)
     annot_refs = " ".join(f"{i} 0 R" for i in range(5, 5 + annot_count))
 
     # Object 3: Page object with /Annots array
-    objects.append(f"3 0 obj\n<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Annots [{annot_refs}] >>\nendobj\n")
+    writer.add_object(3, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Annots [{annot_refs}] >>".encode())
 
-    # Object 4: A simple content stream (here the text is fixed; you could also vary it)
-    content = "BT /F1 12 Tf 100 700 Td (File variation) Tj ET"
-    content_length = len(content.encode("utf-8"))
-    objects.append(f"4 0 obj\n<< /Length {content_length} >>\nstream\n{content}\nendstream\nendobj\n")
+    # Object 4: A simple content stream
+    writer.add_object(4, b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
 
-    # Objects for annotations (objects 5 to 4+annot_count)
+    # Objects for annotations (objects 5 to 4+annot_count); the annotation
+    # strings are fixed templates, so their encoding is cached.
     obj_num = 5
     for annot in annotations:
-        objects.append(f"{obj_num} 0 obj\n{annot}\nendobj\n")
+        writer.add_object(obj_num, template_bytes(annot))
         obj_num += 1
 
-    # Assemble PDF header and body
-    header = "%PDF-1.4\n%âãÏÓ\n"
-    pdf_body = "".join(objects)
-    pdf_without_xref = header + pdf_body
-
-    # Compute xref offsets for each object after the header.
-    offsets = []
-    current_offset = len(header.encode("utf-8"))
-    for obj in objects:
-        offsets.append(current_offset)
-        current_offset += len(obj.encode("utf-8"))
-
-    # Build xref table.
-    xref_entries = ["0000000000 65535 f \n"]
-    for off in offsets:
-        xref_entries.append(f"{off:010d} 00000 n \n")
-    xref_section = "xref\n0 %d\n%s" % (len(xref_entries), "".join(xref_entries))
-
-    # Build the trailer.
-    trailer = f"trailer\n<< /Size {len(xref_entries)} /Root 1 0 R >>\n"
-    startxref = f"startxref\n{len(pdf_without_xref.encode('utf-8'))}\n"
-    eof = "%%EOF\n"
-
-    pdf_complete = pdf_without_xref + xref_section + trailer + startxref + eof
-    return pdf_complete.encode("utf-8")
+    # Build xref table and the trailer.
+    size = obj_num
+    startxref = writer.write_xref(size)
+    writer.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, startxref))
+    return writer.getvalue()
+
+def predicted_size(annotations, content_len=len(CONTENT)):
+    """Exact size build_pdf() gives for these annotations, without building it."""
+    size = len(template_bytes(GEN_HEADER.format("1.4")))
+    n = len(annotations)
+    refs = sum(len(b" %d 0 R" % i) for i in range(5, 5 + n)) - 1 if n else 0
+    bodies = [
+        len(b"<< /Type /Catalog /Pages 2 0 R >>"),
+        len(b"<< /Type /Pages /Count 1 /Kids [3 0 R] >>"),
+        len(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Annots [] >>") + refs,
+        len(b"<< /Length %d >>\nstream\n\nendstream" % content_len) + content_len,
+    ] + [len(template_bytes(a)) for a in annotations]
+    size += sum(object_size(num, body) for num, body in enumerate(bodies, 1))
+    size += xref_size(n + 5)
+    startxref = size - xref_size(n + 5)
+    return size + len(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (n + 5, startxref))
+
+def weighted_order(rng, weights, annotations=annotation_objects):
+    """
+    The annotations in a random order drawn one at a time in proportion to
+    their subtype weight combined with the pair weights of the subtypes
+    drawn before them (as gen1 draws a page), so a prefix is a weighted
+    sample without replacement. Annotations of weight 0 come last.
+    """
+    left = list(annotations)
+    order, on_page = [], []
+    while left:
+        w = [subtype_weight(weights, template_subtype(annot), on_page) for annot in left]
+        if not any(x > 0 for x in w):
+            rng.shuffle(left)
+            return order + left
+        annot = left.pop(rng.choices(range(len(left)), w)[0])
+        order.append(annot)
+        on_page.append(template_subtype(annot))
+    return order
+
+def choose_annotations(rng, budget=None, weights=None):
+    """
+    Pick a random subset (at least 5) of the annotations, in random order.
+    With a budget the subset is shortened (down to one annotation) or
+    extended with the remaining shuffled annotations to fit it; with
+    weights (see batch.load_weights) heavier subtypes are picked first.
+    """
+    if weights is None:
+        # Start with a copy of all annotations and shuffle it.
+        annot_list = annotation_objects.copy()
+        rng.shuffle(annot_list)
+    else:
+        annot_list = weighted_order(rng, weights)
+    # Choose a random subset—here we take between 5 and 26 annotations.
+    n = rng.randint(5, len(annot_list))
+    if budget:
+        n = fit_count(annot_list, n, budget, 1, len(annot_list))
+    return annot_list[:n]
+
+def fit_count(annot_list, n, budget, lo, hi):
+    """Shorten (down to lo) or extend (up to hi) the prefix length n to fit budget."""
+    while n > lo and predicted_size(annot_list[:n]) > budget:
+        n -= 1
+    while n < hi and predicted_size(annot_list[: n + 1]) <= budget:
+        n += 1
+    return n
+
+def choose_class_annotations(rng, seed_class, annot_range, budget=None, weights=None):
+    """
+    Pick annot_range[0]..annot_range[1] annotations that make sum.py put
+    the seed in seed_class: one of each kind the class requires, then more
+    of the kinds it allows (repeating templates once they run out), in
+    random order. With a budget the count is shortened (never below the
+    required kinds) or extended (up to annot_range[1]) to fit it.
+    """
+    allowed = set(ALLOWED_KINDS[seed_class])
+    pool = [a for a in annotation_objects if subtype_kind(template_subtype(a)) in allowed]
+    if weights is None:
+        rng.shuffle(pool)
+    else:
+        pool = weighted_order(rng, weights, pool)
+    front = []
+    for kind in REQUIRED_KINDS[seed_class]:
+        annot = next(a for a in pool if subtype_kind(template_subtype(a)) == kind)
+        pool.remove(annot)
+        front.append(annot)
+    lo, hi = annot_range
+    annot_list = front + pool
+    while pool and len(annot_list) < hi:
+        annot_list += pool[: hi - len(annot_list)]
+    hi = min(hi, len(annot_list))
+    n = rng.randint(min(lo, hi), hi)
+    if budget:
+        n = fit_count(annot_list, n, budget, len(front), hi)
+    chosen = annot_list[:n]
+    rng.shuffle(chosen)
+    return chosen
+
+def padded_content(annotations, budget):
+    """
+    The content stream padded with a trailing comment so the file lands just
+    under budget; the /Length and startxref values may gain a digit, so the
+    padding shrinks by any overshoot.
+    """
+    room = budget - predicted_size(annotations)
+    if room < 3:
+        return CONTENT
+    n = room - 2
+    while n > 0:
+        content = CONTENT + b"\n%" + b"x" * n
+        over = predicted_size(annotations, len(content)) - budget
+        if over <= 0:
+            return content
+        n -= over
+    return CONTENT
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Generate one-page PDFs with varied annotation subsets.")
+    add_batch_args(p, OUT_DIR)
+    args = p.parse_args()
+    check_batch_args(p, args)
+    return args
+
+def generate(job):
+    """Worker: build file `index` of `master_seed`; returns (index, pdf bytes)."""
+    master_seed, index, options = job
+    budget = pick_budget(master_seed, index, options)
+    rng = seed_rng(master_seed, index)
+    seed_class = options["seed_class"]
+    if seed_class is None:
+        annotations = choose_annotations(rng, budget, options["weights"])
+    else:
+        annot_range = options["class_ranges"][seed_class]
+        annotations = choose_class_annotations(rng, seed_class, annot_range, budget, options["weights"])
+    if not budget:
+        return index, build_pdf(annotations)
+    return index, build_pdf(annotations, padded_content(annotations, budget))
 
 def main():
-    os.makedirs("pdf_outputs_2", exist_ok=True)
-    for i in range(1, 51):
-        # For every PDF file, start with a copy of all annotations and shuffle it.
-        annot_list = annotation_objects.copy()
-        random.shuffle(annot_list)
-        # Choose a random subset—here we take between 5 and 26 annotations.
-        n = random.randint(5, len(annot_list))
-        annot_subset = annot_list[:n]
-
-        # Build the PDF from the randomly selected subset.
-        pdf_data = build_pdf(annot_subset)
-        filename = os.path.join("pdf_outputs_2", f"generated_2_{i}.pdf")
-        with open(filename, "wb") as f:
-            f.write(pdf_data)
-        # Optional: a warning if the PDF ends up larger than 10 KB (which is unlikely here).
-        if len(pdf_data) >= 10 * 1024:
-            print(f"Warning: {filename} size is {len(pdf_data)} bytes.")
-    print("Generated 100 different PDF files in the 'pdf_outputs_2' directory.")
+    run_batch(parse_args(), generate, "generated_2_{}.pdf")
 
 if __name__ == "__main__":
     main()
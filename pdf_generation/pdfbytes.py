@@ -0,0 +1,286 @@
+"""
+Bytes-level PDF writer shared by the seed generators (gen1.py, gen2.py, pook.py).
+
+Objects are appended as pre-encoded byte fragments to a single bytearray and
+their xref offsets are taken from its running length, so a document is
+encoded exactly once and building it is linear in its size. Fixed template
+text (annotation dictionaries and the like) is encoded once per process and
+reused through template_bytes().
+
+Besides classic xref tables the writer can pack objects into /ObjStm object
+streams and finish a file with a PDF 1.5 cross-reference stream, either of
+them optionally Flate-compressed.
+
+write_pdfrw() serializes a pdfrw object graph in memory with pdfrw's own
+formatter, and PdfrwSizer estimates that output's size without serializing
+anything.
+"""
+
+import zlib
+from functools import lru_cache
+
+# Header as written by gen1/gen2 (the binary marker is UTF-8 encoded there)
+GEN_HEADER = "%PDF-{}\n%âãÏÓ\n"
+XREF_ENTRY = 20
+
+
+@lru_cache(maxsize=None)
+def template_bytes(text):
+    """UTF-8 encoding of a fixed template string, cached."""
+    return text.encode("utf-8")
+
+
+def object_size(num, body_len):
+    """Serialized size of object num with a body of body_len bytes (see add_object)."""
+    return len(b"%d 0 obj\n" % num) + body_len + len(b"\nendobj\n")
+
+
+def xref_size(size):
+    """Serialized size of a classic xref table covering objects 0..size-1 (see write_xref)."""
+    return len(b"xref\n0 %d\n" % size) + XREF_ENTRY * size
+
+
+class PdfByteWriter:
+    """Appends PDF fragments to one bytearray, recording object offsets as it goes."""
+
+    def __init__(self, header):
+        self.buf = bytearray(header)
+        self.offsets = {}  # object number -> byte offset of "N 0 obj"
+        self.compressed = {}  # object number -> (object stream number, index in it)
+
+    def tell(self):
+        return len(self.buf)
+
+    def write(self, data):
+        self.buf += data
+
+    def add_object(self, num, body):
+        """Append `num 0 obj <body> endobj`; body is bytes without the obj/endobj lines."""
+        self.offsets[num] = len(self.buf)
+        self.buf += b"%d 0 obj\n" % num
+        self.buf += body
+        self.buf += b"\nendobj\n"
+
+    def add_stream(self, num, entries, data, flate=False):
+        """
+        Append stream object num; entries are the dictionary entries besides
+        /Length and /Filter (bytes, may be empty).
+        """
+        if flate:
+            data = zlib.compress(data)
+            entries += b" /Filter /FlateDecode"
+        self.add_object(num, b"<< %s /Length %d >>\nstream\n%s\nendstream" % (entries.lstrip(), len(data), data))
+
+    def add_object_stream(self, num, objects, flate=False):
+        """
+        Pack [(object number, body)] into object stream num. The packed
+        objects become type 2 entries of the cross-reference stream.
+        """
+        pairs = []
+        pos = 0
+        for index, (obj_num, body) in enumerate(objects):
+            self.compressed[obj_num] = (num, index)
+            pairs.append(b"%d %d" % (obj_num, pos))
+            pos += len(body) + 1
+        head = b" ".join(pairs) + b"\n"
+        data = head + b"\n".join(body for _, body in objects)
+        self.add_stream(num, b"/Type /ObjStm /N %d /First %d" % (len(objects), len(head)), data, flate)
+
+    def write_xref_stream(self, num, size, entries, flate=False):
+        """
+        Append cross-reference stream object num covering objects 0..size-1
+        (num itself included) and return its offset, i.e. the startxref
+        value. entries are the trailer keys besides /Size (e.g. b"/Root 1 0 R").
+        """
+        start = len(self.buf)
+        self.offsets[num] = start
+        width = max(1, (max(start, size).bit_length() + 7) // 8)
+        rows = [b"\x00" + bytes(width) + b"\xff\xff"]
+        for i in range(1, size):
+            if i in self.compressed:
+                stream_num, index = self.compressed[i]
+                rows.append(b"\x02" + stream_num.to_bytes(width, "big") + index.to_bytes(2, "big"))
+            elif i in self.offsets:
+                rows.append(b"\x01" + self.offsets[i].to_bytes(width, "big") + b"\x00\x00")
+            else:
+                rows.append(b"\x00" + bytes(width) + b"\x00\x00")
+        entries = b"/Type /XRef /Size %d /W [1 %d 2] %s" % (size, width, entries)
+        self.add_stream(num, entries, b"".join(rows), flate)
+        return start
+
+    def write_xref(self, size):
+        """
+        Append a classic xref table covering objects 0..size-1 (objects that
+        were never added get offset 0) and return its offset, i.e. the
+        startxref value. Each entry is 20 bytes.
+        """
+        start = len(self.buf)
+        offsets = self.offsets
+        self.buf += b"xref\n0 %d\n0000000000 65535 f \n" % size
+        self.buf += b"".join(b"%010d 00000 n \n" % offsets.get(i, 0) for i in range(1, size))
+        return start
+
+    def getvalue(self):
+        return bytes(self.buf)
+
+
+# ════════════════════════════════════════════════════════════
+# pdfrw object graphs
+# ════════════════════════════════════════════════════════════
+def pdfrw_page_trailer(page):
+    """
+    Wrap a single pdfrw page dictionary in a fresh Catalog/Pages tree, the
+    way pdfrw's PdfWriter.addpage() does, and return the trailer dictionary.
+    """
+    from pdfrw import IndirectPdfDict, PdfArray, PdfDict, PdfName, PdfObject
+
+    inheritable = page.inheritable
+    new_page = IndirectPdfDict(
+        page,
+        Resources=inheritable.Resources,
+        MediaBox=inheritable.MediaBox,
+        CropBox=inheritable.CropBox,
+        Rotate=inheritable.Rotate,
+    )
+    pages = IndirectPdfDict(Type=PdfName.Pages, Count=PdfObject(1), Kids=PdfArray([new_page]))
+    new_page.Parent = pages
+    new_page.indirect = True
+    return PdfDict(Root=IndirectPdfDict(Type=PdfName.Catalog, Pages=pages))
+
+
+def write_pdfrw(trailer, version="1.3"):
+    """
+    Serialize the pdfrw object graph reachable from trailer with pdfrw's
+    FormatObjects(), uncompressed, and return the PDF bytes. For a trailer
+    from pdfrw_page_trailer() around a fresh page dictionary (one that is
+    not part of a page tree read from a file, as in pook.py) these are the
+    bytes PdfWriter().addpage(page).write() produces; for pages read from
+    a file, PdfWriter additionally swaps references to the old page tree.
+    """
+    import io
+    from pdfrw.pdfwriter import FormatObjects
+
+    out = io.BytesIO()
+    FormatObjects(out, trailer, version, compress=False, killobj={})
+    return out.getvalue()
+
+
+class PdfrwSizer:
+    """
+    Memoized estimate of how many bytes write_pdfrw() spends on a pdfrw
+    object graph. Every indirect object is walked once and its own size
+    (its body, with references to other indirect objects counted as
+    references) is remembered; a graph's size adds those up over the
+    indirect objects it reaches, counting each shared object once. Object
+    numbers are assumed to have two digits but lines are wrapped the way
+    pdfrw wraps them, so the estimate is typically within a byte
+    or two per object.
+    """
+
+    REF_LEN = len("NN 0 R")
+    OBJ_OVERHEAD = len("NN 0 obj\n") + len("\nendobj\n") + XREF_ENTRY
+    FILE_OVERHEAD = len("%PDF-1.3\n%\xe2\xe3\xcf\xd3\n") + len("xref\n0 NN\n") + XREF_ENTRY + len(
+        "trailer\n\n\nstartxref\nNNNNN\n%%EOF\n"
+    )
+
+    def __init__(self):
+        self.memo = {}  # id(indirect object) -> (object, own size, indirect children)
+        self._active = set()
+
+    def forget(self, obj):
+        """Drop the memoized size of obj (after it was modified)."""
+        self.memo.pop(id(obj), None)
+
+    def _indirect(self, obj):
+        from pdfrw import PdfDict
+
+        if isinstance(obj, PdfDict):
+            return bool(obj.indirect or obj.stream is not None)
+        return bool(getattr(obj, "indirect", False))
+
+    def _value(self, obj, children):
+        """Size of obj where it is used: a reference, or its inline text."""
+        if isinstance(obj, (list, dict, tuple)) and self._indirect(obj):
+            children.append(obj)
+            return self.REF_LEN
+        return self._body(obj, children)
+
+    def _body(self, obj, children):
+        from pdfrw import PdfDict
+        from pdfrw.objects import PdfString
+
+        if isinstance(obj, (list, dict, tuple)):
+            if id(obj) in self._active:
+                return 0
+            self._active.add(id(obj))
+            try:
+                if isinstance(obj, dict):
+                    items = obj.iteritems() if isinstance(obj, PdfDict) else obj.items()
+                    sizes = []
+                    for key, value in items:
+                        sizes.append(len(getattr(key, "encoded", None) or key))
+                        sizes.append(self._value(value, children))
+                    size = self._joined(sizes, 4)
+                    stream = getattr(obj, "stream", None)
+                    if stream is not None:
+                        size += len("\nstream\n\nendstream") + len(stream)
+                    return size
+                sizes = [self._value(x, children) for x in obj]
+                return self._joined(sizes, 2)
+            finally:
+                self._active.discard(id(obj))
+        if hasattr(obj, "indirect"):
+            return len(str(getattr(obj, "encoded", None) or obj))
+        if isinstance(obj, (str, bytes)):
+            return len(PdfString.encode(obj))
+        if isinstance(obj, float):
+            return len(("%.9f" % obj).rstrip("0").rstrip("."))
+        return len(str(obj))
+
+    @staticmethod
+    def _joined(sizes, brackets):
+        """Size of pdfrw's format_array() output for items of these sizes."""
+        size = brackets + sum(sizes) + max(0, len(sizes) - 1)
+        if sum(sizes) <= 70:
+            return size
+        lines, count = 0, 1000000
+        for n in sizes:
+            count += n + 1
+            if count > 71:
+                lines += 1
+                count = n + 1
+        return size + 2 * (lines - 1)
+
+    def _own(self, obj):
+        entry = self.memo.get(id(obj))
+        if entry is None:
+            children = []
+            entry = self.memo[id(obj)] = (obj, self._body(obj, children), children)
+        return entry
+
+    def graph_size(self, *roots):
+        """
+        Bytes of the given objects plus every indirect object they reach,
+        each shared indirect object counted once.
+        """
+        total = 0
+        stack = []
+        for root in roots:
+            if isinstance(root, (list, dict, tuple)) and self._indirect(root):
+                stack.append(root)
+            else:
+                total += self._body(root, stack)
+        seen = set()
+        while stack:
+            obj = stack.pop()
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            _, size, children = self._own(obj)
+            total += size + self.OBJ_OVERHEAD
+            stack.extend(children)
+        return total
+
+    def pdf_size(self, trailer):
+        """Estimated len(write_pdfrw(trailer))."""
+        return self.FILE_OVERHEAD + len(" /Size NN") + self.graph_size(trailer)
@@ -1,129 +1,322 @@
 import os
+import sys
 import random
 import shutil
-import io
-from pdfrw import PdfReader, PdfWriter, PdfDict, PdfArray, PdfName
+import sqlite3
+import hashlib
+from pdfrw import PdfReader, PdfDict, PdfArray, PdfName, PdfObject
+from pdfrw.objects.pdfindirect import PdfIndirect
 import logging
 
+from pdfbytes import PdfrwSizer, write_pdfrw, pdfrw_page_trailer
+from sink import open_sink, sink_kind
+
 logging.getLogger("pdfrw").setLevel(logging.CRITICAL)
 
 # === CONFIG ===
 input_dir   = "bake_fuzzer_seed_corpus"
-output_dir  = "test"
+output_dir  = "test"   # or a .zip/.tar[.gz] archive, or "-" for records on stdout
+zip_compression = "stored"   # or "deflated"
+pool_db     = "pook_pool.sqlite"   # on-disk annotation index, refreshed per changed input file
 total_keep  = 400      # widgets + other annots
 num_seeds   = 100
 max_size_b  = 10 * 1024
-NUM_OBJECTS = 5  # max number of objects in each seed
+NUM_OBJECTS = None  # cap on annotations per seed (None: as many as fit in max_size_b)
+
+WIDGET_STRIP_KEYS = ("/DA", "/MK", "/Border", "/AP", "/TU")
 
 # Clean output
-shutil.rmtree(output_dir, ignore_errors=True)
-os.makedirs(output_dir, exist_ok=True)
+if sink_kind(output_dir) == "dir":
+    shutil.rmtree(output_dir, ignore_errors=True)
+# with records on stdout, all messages go to stderr
+log = sys.stderr if sink_kind(output_dir) == "stdout" else sys.stdout
+
+# === PHASE 1: Index every annotation on disk ===
+# One row per /Annots entry: (estimated size, path, page, slot in /Annots,
+# object number, class, subtype, MediaBox, CropBox, structure hash). The
+# size is what the annotation and everything it reaches add to a seed
+# (PdfrwSizer, each object of a file walked once). Readers are dropped
+# after each file, so memory does not grow with the corpus; only the
+# annotations picked in phase 2 are ever loaded again. Rows with the same
+# hash are copies of one structure and only the smallest one is picked.
+
+POOL_VERSION = 2  # bump when rows change meaning (e.g. how sizes are computed): older pools are rebuilt
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime REAL);
+CREATE TABLE IF NOT EXISTS pool (
+    size INTEGER, path TEXT, page INTEGER, slot INTEGER,
+    objnum INTEGER, gen INTEGER, class TEXT, subtype TEXT, media TEXT, crop TEXT,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS pool_class_size ON pool (class, size);
+CREATE INDEX IF NOT EXISTS pool_path ON pool (path);
+"""
+
+def box_text(box):
+    return None if box is None else " ".join(str(x) for x in box)
+
+def text_box(text):
+    return None if text is None else PdfArray([PdfObject(x) for x in text.split()])
+
+def annotation_hash(annot, strip=()):
+    """
+    Hex digest of an annotation's structure as it ends up in a seed: its
+    keys and values and everything it reaches, with references replaced by
+    the hash of their target, so copies in different files match. The keys
+    in strip and every /P (the host page) are left out; a reference back to
+    an object that is still being hashed hashes as how far up it points.
+    """
+    memo = {}
+    active = {}  # id -> depth of the objects being hashed
+
+    def digest(*parts):
+        return hashlib.sha1(b"".join(parts)).digest()
+
+    def walk(obj, skip=()):
+        """Return (digest, depth of the highest active object referenced)."""
+        key = id(obj)
+        if key in active:
+            return digest(b"@", str(len(active) - active[key]).encode()), active[key]
+        if key in memo:
+            return memo[key], len(active)
+        if not isinstance(obj, (list, dict)):
+            return digest(b"v", str(obj).encode("utf-8", "replace")), len(active)
+        depth = active[key] = len(active)
+        parts, low = [], depth
+        if isinstance(obj, dict):
+            items = obj.iteritems() if isinstance(obj, PdfDict) else obj.items()
+            for name, value in sorted(items, key=lambda kv: kv[0]):
+                if name in skip or name == "/P":
+                    continue
+                h, up = walk(value)
+                parts += [digest(b"k", name.encode("utf-8")), h]
+                low = min(low, up)
+            stream = getattr(obj, "stream", None)
+            if stream is not None:
+                raw = stream.encode("latin-1", "replace") if isinstance(stream, str) else stream
+                parts.append(digest(b"s", raw))
+            h = digest(b"d", *parts)
+        else:
+            for value in obj:
+                h, up = walk(value)
+                parts.append(h)
+                low = min(low, up)
+            h = digest(b"a", *parts)
+        del active[key]
+        if low >= depth:  # no reference above this object: same hash wherever it is met
+            memo[key] = h
+        return h, low
 
-# === PHASE 1: Build two balanced pools, storing the PdfDict itself ===
+    return walk(annot, strip)[0].hex()
 
-widget_pool = []  # (proxy, path, page_medabox, cropbox, PdfDict)
-annot_pool  = []
+def scan_annotations(path):
+    """Yield a pool row for every annotation dictionary on the pages of path."""
+    reader = PdfReader(path)
+    sizer = PdfrwSizer()
+    for pno, page in enumerate(reader.pages):
+        annots = page.Annots
+        if not isinstance(annots, list):
+            continue
+        media = box_text(page.MediaBox)
+        crop = box_text(page.CropBox or page.MediaBox)
+        # iterate the unresolved array to see the references themselves
+        for slot, item in enumerate(list.__iter__(annots)):
+            objnum = gen = None
+            if isinstance(item, PdfIndirect):
+                objnum, gen = item
+                item = item.real_value()
+            if not isinstance(item, PdfDict):
+                continue
+            proxy = sizer.graph_size(item)
+            # classify
+            kind = "widget" if getattr(item, "Subtype", None) == PdfName.Widget else "annot"
+            subtype = str(item.Subtype or "/")[1:]
+            digest = annotation_hash(item, WIDGET_STRIP_KEYS if kind == "widget" else ())
+            yield (proxy, path, pno, slot, objnum, gen, kind, subtype, media, crop, digest)
 
-for fn in os.listdir(input_dir):
-    if not fn.lower().endswith(".pdf"):
+db = sqlite3.connect(pool_db)
+if db.execute("PRAGMA user_version").fetchone()[0] != POOL_VERSION:
+    db.executescript("DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS pool;")
+    db.execute(f"PRAGMA user_version = {POOL_VERSION}")
+db.executescript(SCHEMA)
+known = {path: (size, mtime) for path, size, mtime in db.execute("SELECT path, size, mtime FROM files")}
+present = set()
+scanned = 0
+for de in os.scandir(input_dir):
+    if not de.name.lower().endswith(".pdf"):
+        continue
+    st = de.stat()
+    present.add(de.path)
+    if known.get(de.path) == (st.st_size, st.st_mtime):
         continue
-    path = os.path.join(input_dir, fn)
     try:
-        reader = PdfReader(path)
+        rows = list(scan_annotations(de.path))
     except Exception:
-        continue
+        rows = []
+    with db:
+        db.execute("DELETE FROM pool WHERE path = ?", (de.path,))
+        db.executemany("INSERT INTO pool VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (de.path, st.st_size, st.st_mtime))
+    scanned += 1
+with db:
+    for path in set(known) - present:
+        db.execute("DELETE FROM pool WHERE path = ?", (path,))
+        db.execute("DELETE FROM files WHERE path = ?", (path,))
 
-    for page in reader.pages:
-        annots = page.Annots or []
-        for a in annots:
-            proxy = len(repr(a))
-            entry = (
-                proxy,
-                path,
-                page.MediaBox,
-                page.CropBox or page.MediaBox,
-                a  # store the PdfDict for reuse
-            )
-            # classify
-            if getattr(a, "Subtype", None) == PdfName.Widget:                
-                widget_pool.append(entry)
-            else:
-                annot_pool.append(entry)
+def pool_count(kind):
+    return db.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT hash) FROM pool WHERE class = ?", (kind,)
+    ).fetchone()
 
-# sort by proxy size and trim to half each
-widget_pool.sort(key=lambda e: e[0])
-annot_pool .sort(key=lambda e: e[0])
+print(f"Indexed {scanned} changed of {len(present)} files in {pool_db}", file=log)
+(w_all, w_distinct), (a_all, a_distinct) = pool_count("widget"), pool_count("annot")
+print(f"Pools: {w_all} widgets ({w_distinct} distinct), {a_all} annots ({a_distinct} distinct)", file=log)
 
-for entry in widget_pool:
-    pdfdict = entry[4]
-    try:
-        for key in ("/DA", "/MK", "/Border", "/AP", "/TU"):
-            del pdfdict[key]
-    except KeyError:
-        pass
+# keep the smallest half of each class, one copy of each structure
+half = total_keep // 2
+def select_pool(kind):
+    return db.execute(
+        "SELECT size, path, page, slot, objnum, gen, media, crop, subtype FROM ("
+        "  SELECT *, ROW_NUMBER() OVER (PARTITION BY hash ORDER BY size, path, page, slot) AS copy"
+        "  FROM pool WHERE class = ?"
+        ") WHERE copy = 1 ORDER BY size, path, page, slot LIMIT ?",
+        (kind, half),
+    ).fetchall()
 
-print(f"Pools: {len(widget_pool)} widgets, {len(annot_pool)} annots")
+widget_pool = select_pool("widget")
+annot_pool  = select_pool("annot")
+db.close()
 
-# for i in range(3000):
-#     print(widget_pool[i])
-#     print(f"{i} ##########################################################################")
-#     print(annot_pool[i])
-#     print()
-    
-# exit(1)
+print(f"Pools: {len(widget_pool)} widgets, {len(annot_pool)} annots", file=log)
 
-half = total_keep // 2
-widget_pool = widget_pool[:half]
-annot_pool  = annot_pool [:half]
+# Selected annotations are loaded on first use; one reader per source file.
+readers = {}
+loaded = {}
 
-print(f"Pools: {len(widget_pool)} widgets, {len(annot_pool)} annots")
+def materialize(row, widget):
+    """
+    Return the pool entry (size, path, MediaBox, CropBox, PdfDict) of a row,
+    loading the annotation from its file. Widgets lose the keys in
+    WIDGET_STRIP_KEYS, each one independently of the others.
+    """
+    if row in loaded:
+        return loaded[row]
+    size, path, pno, slot, objnum, gen, media, crop, _ = row
+    reader = readers.get(path)
+    if reader is None:
+        reader = readers[path] = PdfReader(path)
+    if objnum is not None:
+        pdfdict = reader.findindirect(objnum, gen).real_value()
+    else:
+        pdfdict = reader.pages[pno].Annots[slot]
+    if widget:
+        for key in WIDGET_STRIP_KEYS:
+            try:
+                del pdfdict[key]
+            except KeyError:
+                pass
+    loaded[row] = entry = (size, path, text_box(media), text_box(crop), pdfdict)
+    return entry
 
 # === PHASE 2: Generate seeds ===
 
-def make_pdf_bytes(entries):
+def make_trailer(media, crop, annots):
     """
-    entries: list of tuples as in the pools,
-    we ignore proxy and path here because we only need
-    one MediaBox/CropBox (they should all be the same size
-    before sampling mixed from different pages—this is simplest).
+    Return the trailer of a one-page document with the given boxes (as
+    stored in the pool entries) holding the annotation dictionaries annots.
     """
-    # Use the MediaBox/CropBox of the first entry
-    _, _, media, crop, _ = entries[0]
     page = PdfDict(
         Type      = PdfName.Page,
         MediaBox  = media,
         CropBox   = crop,
         Resources = PdfDict(),
         Contents  = PdfArray(),
-        Annots    = PdfArray([e[4] for e in entries])
+        Annots    = PdfArray(annots)
     )
-    pdf = PdfWriter()
-    pdf.addpage(page)
-    buf = io.BytesIO()
-    pdf.write(buf)
-    return buf.getvalue()
+    return pdfrw_page_trailer(page)
 
-for i in range(1, num_seeds + 1):
-    # pick 1–5 total
-    n = random.randint(1, NUM_OBJECTS)
-    w = n // 2
-    a = n - w
+sizer = PdfrwSizer()  # shared by all seeds: pooled objects are sized once
+# what each /Annots entry adds besides the annotation itself
+ENTRY_COST = PdfrwSizer.REF_LEN + 1
 
-    chosen = random.sample(widget_pool, w) + random.sample(annot_pool, a)
-    random.shuffle(chosen)
+def fill(chosen, queues, left):
+    """
+    Greedily add rows from queues ({widget?: rows in random order}) to
+    chosen ([(row, widget)]) while their indexed sizes fit in left bytes:
+    always from the class with fewer entries so far, preferring a subtype
+    the seed does not contain yet. Returns whether anything was added.
+    """
+    counts = {w: sum(1 for _, cw in chosen if cw == w) for w in (True, False)}
+    subtypes = {row[8] for row, _ in chosen}
+    added = False
+    while NUM_OBJECTS is None or len(chosen) < NUM_OBJECTS:
+        picked = None
+        for widget in sorted(queues, key=lambda w: (counts[w], random.random())):
+            fits = [r for r in queues[widget] if r[0] + ENTRY_COST <= left]
+            if fits:
+                picked = next((r for r in fits if r[8] not in subtypes), fits[0])
+                break
+        if picked is None:
+            return added
+        queues[widget].remove(picked)
+        chosen.append((picked, widget))
+        counts[widget] += 1
+        subtypes.add(picked[8])
+        left -= picked[0] + ENTRY_COST
+        added = True
+    return added
+
+def choose_entries():
+    """
+    Pick the pool entries of one seed so that it lands just under
+    max_size_b. Indexed sizes overestimate (objects shared between
+    annotations are counted in each, widgets are sized before stripping),
+    so after every greedy pass the seed is measured again with the shared
+    sizer and the remaining space filled, until nothing else fits.
+    """
+    queues = {
+        True: random.sample(widget_pool, len(widget_pool)),
+        False: random.sample(annot_pool, len(annot_pool)),
+    }
+    chosen = []
+    left = max_size_b - base_size
+    while fill(chosen, queues, left):
+        annots = [materialize(row, widget)[4] for row, widget in chosen]
+        left = max_size_b - base_size - sizer.graph_size(*annots) - ENTRY_COST * len(annots)
+    if not chosen:  # nothing fits: a single smallest entry, as before
+        widget = not annot_pool
+        chosen = [(min(widget_pool if widget else annot_pool), widget)]
+    return [materialize(row, widget) for row, widget in chosen]
 
-    data = make_pdf_bytes(chosen)
+# header, catalog, page tree and xref of a seed without annotations
+_, _, media, crop, _ = materialize(*((widget_pool[0], True) if widget_pool else (annot_pool[0], False)))
+base_size = PdfrwSizer().pdf_size(make_trailer(media, crop, []))
+
+sink = open_sink(output_dir, zip_compression)
+sizes = []
+for i in range(1, num_seeds + 1):
+    chosen = choose_entries()
+    random.shuffle(chosen)
 
-    # if oversize, strip any stream data from each annot and retry
-    if len(data) > max_size_b:
-        for entry in chosen:
-            annot = entry[4]
-            if hasattr(annot, "stream"):
-                annot.stream = b""
-        data = make_pdf_bytes(chosen)
+    # boxes of the first entry (they differ little across the corpus);
+    # drop entries while the estimate is over, then serialize once
+    _, _, media, crop, _ = chosen[0]
+    while True:
+        trailer = make_trailer(media, crop, [e[4] for e in chosen])
+        pages = trailer.Root.Pages
+        fits = sizer.pdf_size(trailer) <= max_size_b
+        for obj in (trailer.Root, pages, pages.Kids[0]):
+            sizer.forget(obj)  # per-seed objects; only pooled ones stay memoized
+        if fits or len(chosen) == 1:
+            break
+        chosen.pop()
+    data = write_pdfrw(trailer)
+    sizes.append(len(data))
 
     out_name = f"seed_{i:03d}.pdf"
-    with open(os.path.join(output_dir, out_name), "wb") as f:
-        f.write(data)
+    sink.add(out_name, data)
+sink.close()
 
-print(f"✅ Generated {num_seeds} PDFs, each ≤10 KB, balanced widgets/annotations.")  
+print(f"✅ Generated {num_seeds} PDFs of {min(sizes)}–{max(sizes)} bytes (budget {max_size_b}), "
+      f"balanced widgets/annotations.", file=log)
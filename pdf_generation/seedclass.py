@@ -0,0 +1,85 @@
+"""
+Seed classes shared by sum.py and the generators, so the classes a corpus
+is generated for are the classes it is summarized in.
+
+A seed is classified from the /Subtype of every entry of its pages' /Annots
+arrays: Widget entries are widgets, Link and Popup are not counted at all
+(PyMuPDF's page.annots() never yields them) and everything else is an
+annotation. The generators build a seed of a given class from a list of
+annotation kinds ("annot", "widget" or "hidden") that plan_kinds() draws.
+"""
+
+# Subtypes that PyMuPDF's page.annots() never yields (MuPDF keeps links in a
+# separate list and hides popups), so counting them would break agreement.
+HIDDEN_SUBTYPES = {"Link", "Popup"}
+
+CLASSES = {
+    "only_annots": "Only annotations",
+    "only_widgets": "Only widgets",
+    "both": "Both annots+widgets",
+    "neither": "Neither annotations nor widgets",
+}
+
+# kinds a seed of each class must contain, and the kinds it may contain
+REQUIRED_KINDS = {
+    "only_annots": ["annot"],
+    "only_widgets": ["widget"],
+    "both": ["annot", "widget"],
+    "neither": [],
+}
+ALLOWED_KINDS = {
+    "only_annots": ["annot", "hidden"],
+    "only_widgets": ["widget", "hidden"],
+    "both": ["annot", "widget", "hidden"],
+    "neither": ["hidden"],
+}
+
+# default range of the number of /Annots entries of a seed, per class
+DEFAULT_RANGES = {
+    "only_annots": (1, 8),
+    "only_widgets": (1, 8),
+    "both": (2, 10),
+    "neither": (0, 2),
+}
+
+
+def classify(a_count, w_count):
+    """Return the class key (see CLASSES) for the given counts."""
+    if a_count > 0 and w_count == 0:
+        return "only_annots"
+    if w_count > 0 and a_count == 0:
+        return "only_widgets"
+    if w_count > 0 and a_count > 0:
+        return "both"
+    return "neither"
+
+
+def split_subtypes(subtypes):
+    """Turn a {subtype: count} mapping into (annotation_count, widget_count)."""
+    widgets = subtypes.get("Widget", 0)
+    annots = sum(
+        n for s, n in subtypes.items() if s != "Widget" and s not in HIDDEN_SUBTYPES
+    )
+    return annots, widgets
+
+
+def subtype_kind(subtype):
+    """"widget", "hidden" or "annot": how a subtype counts towards the class."""
+    if subtype == "Widget":
+        return "widget"
+    if subtype in HIDDEN_SUBTYPES:
+        return "hidden"
+    return "annot"
+
+
+def plan_kinds(rng, seed_class, n, available=("annot", "widget", "hidden")):
+    """
+    Draw the kinds of the n annotations of a seed of seed_class: the
+    required kinds first, then kinds drawn uniformly from the allowed ones
+    that the generator has templates for.
+    """
+    required = REQUIRED_KINDS[seed_class]
+    allowed = [k for k in ALLOWED_KINDS[seed_class] if k in available]
+    if not allowed:
+        return list(required)
+    return required + [rng.choice(allowed) for _ in range(n - len(required))]
@@ -0,0 +1,143 @@
+"""
+Output sinks for the seed generators: a directory, a zip archive (stored or
+deflated), a tar archive, or stdout as a stream of length-prefixed records.
+
+The target decides the kind: "-" is stdout, *.zip a zip archive, *.tar,
+*.tar.gz or *.tgz a tar archive and anything else a directory. Archives are
+written entry by entry from memory, so no per-seed files are created, and
+entries carry a fixed timestamp so the same seeds give the same archive.
+
+A stdout record is
+    >H  length of the UTF-8 name
+        name
+    >I  length of the data
+        data
+and read_records() iterates over such a stream.
+"""
+
+import os
+import io
+import sys
+import struct
+import tarfile
+import zipfile
+
+ZIP_COMPRESSION = {"stored": zipfile.ZIP_STORED, "deflated": zipfile.ZIP_DEFLATED}
+FIXED_DATE = (1980, 1, 1, 0, 0, 0)
+FIXED_MTIME = 315532800  # 1980-01-01 UTC
+
+
+def sink_kind(target):
+    """Return "stdout", "zip", "tar" or "dir" for an output target."""
+    if target == "-":
+        return "stdout"
+    if target.lower().endswith(".zip"):
+        return "zip"
+    if target.lower().endswith((".tar", ".tar.gz", ".tgz")):
+        return "tar"
+    return "dir"
+
+
+class DirSink:
+    """One file per seed in a directory."""
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.where = f"the '{path}' directory"
+
+    def describe(self, name):
+        return os.path.join(self.path, name)
+
+    def add(self, name, data):
+        with open(os.path.join(self.path, name), "wb") as f:
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+class ZipSink:
+    """All seeds in one zip archive, stored or deflated."""
+
+    def __init__(self, path, compression="stored"):
+        self.path = path
+        self.zf = zipfile.ZipFile(path, "w", ZIP_COMPRESSION[compression])
+        self.where = f"'{path}' ({compression})"
+
+    def describe(self, name):
+        return f"{self.path}:{name}"
+
+    def add(self, name, data):
+        info = zipfile.ZipInfo(name, date_time=FIXED_DATE)
+        info.compress_type = self.zf.compression
+        info.external_attr = 0o644 << 16
+        self.zf.writestr(info, data)
+
+    def close(self):
+        self.zf.close()
+
+
+class TarSink:
+    """All seeds in one tar archive (gzip-compressed for .tar.gz/.tgz)."""
+
+    def __init__(self, path):
+        self.path = path
+        mode = "w:gz" if path.lower().endswith(("gz", "tgz")) else "w"
+        self.tf = tarfile.open(path, mode)
+        self.where = f"'{path}'"
+
+    def describe(self, name):
+        return f"{self.path}:{name}"
+
+    def add(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mode = 0o644
+        info.mtime = FIXED_MTIME
+        self.tf.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.tf.close()
+
+
+class RecordSink:
+    """Length-prefixed (name, data) records on a binary stream (stdout by default)."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout.buffer
+        self.where = "stdout"
+
+    def describe(self, name):
+        return name
+
+    def add(self, name, data):
+        raw = name.encode("utf-8")
+        self.stream.write(struct.pack(">H", len(raw)) + raw + struct.pack(">I", len(data)))
+        self.stream.write(data)
+
+    def close(self):
+        self.stream.flush()
+
+
+def open_sink(target, compression="stored"):
+    """Open the sink for target (see the module docstring); compression applies to zips."""
+    kind = sink_kind(target)
+    if kind == "stdout":
+        return RecordSink()
+    if kind == "zip":
+        return ZipSink(target, compression)
+    if kind == "tar":
+        return TarSink(target)
+    return DirSink(target)
+
+
+def read_records(stream):
+    """Yield (name, data) from a stream of length-prefixed records."""
+    while True:
+        head = stream.read(2)
+        if len(head) < 2:
+            return
+        name = stream.read(struct.unpack(">H", head)[0]).decode("utf-8")
+        size = struct.unpack(">I", stream.read(4))[0]
+        yield name, stream.read(size)
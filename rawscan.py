@@ -0,0 +1,507 @@
+"""
+Parse-free annotation/widget counter working directly on the raw PDF bytes.
+
+The file is memory-mapped and its objects are located from the
+cross-reference data the file ends with (xref tables or xref streams,
+following /Prev), checking that every offset really holds the `N G obj`
+header it should. Files without usable xref data are indexed by finding
+every literal `obj` keyword and reading the object and generation numbers
+backwards from it. Objects packed in `/ObjStm` object streams are added
+either way, and /Root comes from the newest trailer (or, for scanned
+files, the last /Root in the file). Only the handful of dictionaries that
+are actually reachable from the catalog are then tokenized: the page tree
+nodes, each page's `/Annots` array and the annotation dictionaries it
+references. Content streams, fonts, images etc. are never looked at.
+"""
+
+import re
+import mmap
+import bisect
+import zlib
+from collections import Counter, namedtuple
+
+Ref = namedtuple("Ref", "num gen")
+
+WS = rb"\x00\t\n\x0c\r "
+DELIMS = rb"()<>\[\]{}/%"
+
+OBJ_HEADER_RE = re.compile(rb"[" + WS + rb"]*(\d+)[" + WS + rb"]+(\d+)[" + WS + rb"]+obj(?![A-Za-z])")
+STARTXREF_RE = re.compile(rb"startxref[" + WS + rb"]+(\d+)")
+XREF_SECTION_RE = re.compile(rb"[" + WS + rb"]*(\d+)[" + WS + rb"]+(\d+)[" + WS + rb"]*")
+XREF_ROW_RE = re.compile(rb"(\d+)[" + WS + rb"]+(\d+)[" + WS + rb"]+([nf])[" + WS + rb"]*")
+TRAILER_RE = re.compile(rb"[" + WS + rb"]*trailer")
+STREAM_RE = re.compile(rb"[" + WS + rb"]*stream\r?\n")
+SKIP_RE = re.compile(rb"(?:[" + WS + rb"]+|%[^\r\n]*)*")
+REF_RE = re.compile(rb"(\d+)[" + WS + rb"]+(\d+)[" + WS + rb"]+R(?![A-Za-z])")
+NAME_RE = re.compile(rb"/([^" + WS + DELIMS + rb"]*)")
+NUMBER_RE = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+KEYWORD_RE = re.compile(rb"[A-Za-z]+")
+HEXSTR_RE = re.compile(rb"<([^>]*)>")
+STRING_SPECIAL_RE = re.compile(rb"[()\\]")
+NAME_ESCAPE_RE = re.compile(rb"#([0-9A-Fa-f]{2})")
+
+MAX_DEPTH = 64
+DIGITS = frozenset(b"0123456789")
+SPACES = frozenset(b"\x00\t\n\x0c\r ")
+
+
+class RawPdf:
+    """Lazily tokenized view of a PDF held in a bytes-like buffer."""
+
+    def __init__(self, buf):
+        self.buf = buf
+        # objnum -> (buffer, offset of the object's value)
+        self.offsets = {}
+        self.cache = {}
+        self._index()
+
+    # ── indexing ────────────────────────────────────────────
+    def _index(self):
+        self.root_ref = None
+        if not self._index_xref():
+            self.offsets.clear()
+            self.root_ref = None
+            self._index_scan()
+            self.object_count = len(self.offsets)
+
+    def _index_xref(self):
+        """
+        Index the objects listed by the xref sections of the file, newest
+        first. Returns False when there is no usable xref data or an offset
+        does not hold the object it should.
+        """
+        buf = self.buf
+        tail = buf.rfind(b"startxref", max(0, len(buf) - 4096))
+        m = STARTXREF_RE.match(buf, tail) if tail >= 0 else None
+        if not m:
+            return False
+        pos = int(m.group(1))
+        compressed = {}  # objnum -> number of the object stream holding it
+        deleted = set()
+        seen = set()
+        try:
+            while pos is not None and pos not in seen and 0 <= pos < len(buf):
+                seen.add(pos)
+                trailer = self._read_xref_section(pos, compressed, deleted)
+                if not isinstance(trailer, dict):
+                    return False
+                if self.root_ref is None and isinstance(trailer.get("Root"), Ref):
+                    self.root_ref = trailer["Root"]
+                hybrid = trailer.get("XRefStm")
+                if isinstance(hybrid, int) and hybrid not in seen:
+                    seen.add(hybrid)
+                    self._read_xref_section(hybrid, compressed, deleted)
+                prev = trailer.get("Prev")
+                pos = prev if isinstance(prev, int) else None
+        except (ValueError, IndexError, TypeError, zlib.error):
+            return False
+        if self.root_ref is None or not self.offsets:
+            return False
+        for stm in sorted(set(compressed.values())):
+            self._index_objstm(stm)
+        # like MuPDF's xref length: free entries count too
+        self.object_count = len((set(self.offsets) | set(compressed) | deleted) - {0})
+        return True
+
+    def _locate(self, num, offset):
+        """Record the value offset of object num, whose header is at offset."""
+        m = OBJ_HEADER_RE.match(self.buf, offset)
+        if not m or int(m.group(1)) != num:
+            raise ValueError(f"object {num} is not at offset {offset}")
+        self.offsets[num] = (self.buf, m.end())
+
+    def _read_xref_section(self, pos, compressed, deleted):
+        """
+        Index one xref table or xref stream at pos (entries already set by a
+        newer section win) and return its trailer dictionary.
+        """
+        buf = self.buf
+        known = lambda num: num in self.offsets or num in compressed or num in deleted
+        start = SKIP_RE.match(buf, pos).end()
+        if buf[start : start + 4] == b"xref":
+            pos = start + 4
+            while True:
+                m = XREF_SECTION_RE.match(buf, pos)
+                if not m:
+                    break
+                first, count = int(m.group(1)), int(m.group(2))
+                pos = m.end()
+                for num in range(first, first + count):
+                    row = XREF_ROW_RE.match(buf, pos)
+                    if not row:
+                        raise ValueError("malformed xref row")
+                    pos = row.end()
+                    if known(num):
+                        continue
+                    if row.group(3) == b"n" and num:
+                        self._locate(num, int(row.group(1)))
+                    else:
+                        deleted.add(num)
+            m = TRAILER_RE.match(buf, pos)
+            if not m:
+                return None
+            return parse_value(buf, m.end())[0]
+
+        # xref stream: an object whose stream lists the entries in binary
+        m = OBJ_HEADER_RE.match(buf, pos)
+        if not m:
+            return None
+        d, data = self._stream_at(buf, m.end())
+        if not isinstance(d, dict) or d.get("Type") != "XRef" or data is None:
+            return None
+        widths = [w if isinstance(w, int) else 0 for w in self.resolve(d.get("W")) or []]
+        index = self.resolve(d.get("Index")) or [0, d.get("Size", 0)]
+        if len(widths) != 3:
+            return None
+        row_len = sum(widths)
+        at = 0
+        for first, count in zip(index[0::2], index[1::2]):
+            for num in range(first, first + count):
+                row = data[at : at + row_len]
+                at += row_len
+                if len(row) < row_len:
+                    return d
+                fields, o = [], 0
+                for w in widths:
+                    fields.append(int.from_bytes(row[o : o + w], "big"))
+                    o += w
+                kind = fields[0] if widths[0] else 1
+                if known(num):
+                    continue
+                if kind == 1 and num:
+                    self._locate(num, fields[1])
+                elif kind == 2:
+                    compressed[num] = fields[1]
+                else:
+                    deleted.add(num)
+        return d
+
+    def _index_scan(self):
+        """
+        Index every `N G obj` header by finding each literal `obj` and
+        reading the numbers backwards from it.
+        """
+        buf = self.buf
+        starts = []
+        pos = buf.find(b"obj")
+        while pos >= 0:
+            header = self._header_before(pos)
+            if header is not None:
+                start, num = header
+                # later definitions (incremental updates) win
+                self.offsets[num] = (buf, pos + 3)
+                starts.append((start, num))
+            pos = buf.find(b"obj", pos + 3)
+
+        # objects packed in object streams never override top-level ones
+        if starts:
+            keys = [s for s, _ in starts]
+            pos = buf.find(b"/ObjStm")
+            while pos >= 0:
+                i = bisect.bisect_right(keys, pos) - 1
+                if i >= 0:
+                    self._index_objstm(starts[i][1])
+                pos = buf.find(b"/ObjStm", pos + 7)
+
+        pos = len(buf)
+        while self.root_ref is None:
+            pos = buf.rfind(b"/Root", 0, pos)
+            if pos < 0:
+                break
+            m = REF_RE.match(buf, SKIP_RE.match(buf, pos + 5).end())
+            if m:
+                self.root_ref = Ref(int(m.group(1)), int(m.group(2)))
+
+    def _header_before(self, pos):
+        """
+        If the `obj` at pos ends an `N G obj` header, return (offset of N, N).
+        """
+        buf = self.buf
+        after = buf[pos + 3 : pos + 4]
+        if after.isalpha():
+            return None
+        i = pos - 1
+        for _ in range(2):
+            j = i
+            while j >= 0 and buf[j] in SPACES:
+                j -= 1
+            if j == i:
+                return None
+            i = j
+            while i >= 0 and buf[i] in DIGITS:
+                i -= 1
+            if i == j:
+                return None
+        return i + 1, int(buf[i + 1 : j + 1])
+
+    def _index_objstm(self, num):
+        try:
+            data = self.stream(num)
+            d = self.get(num)
+            if not isinstance(d, dict) or d.get("Type") != "ObjStm":
+                return
+            n, first = int(d.get("N", 0)), int(d.get("First", 0))
+        except (ValueError, TypeError, IndexError, zlib.error):
+            return
+        if data is None:
+            return
+        header = NUMBER_RE.findall(data[:first])
+        for i in range(min(n, len(header) // 2)):
+            inner = int(header[2 * i])
+            if inner not in self.offsets:
+                self.offsets[inner] = (data, first + int(header[2 * i + 1]))
+
+    # ── object access ───────────────────────────────────────
+    def get(self, num):
+        """Return the parsed value of object `num`, or None."""
+        if num in self.cache:
+            return self.cache[num]
+        self.cache[num] = None  # cycle guard
+        loc = self.offsets.get(num)
+        value = None
+        if loc is not None:
+            try:
+                value, _ = parse_value(loc[0], loc[1])
+            except (ValueError, IndexError):
+                value = None
+        self.cache[num] = value
+        return value
+
+    def resolve(self, value):
+        """Follow a (chain of) indirect reference(s)."""
+        seen = set()
+        while isinstance(value, Ref) and value.num not in seen:
+            seen.add(value.num)
+            value = self.get(value.num)
+        return value
+
+    def stream(self, num):
+        """Return the decoded data of stream object `num` (Flate or unfiltered)."""
+        loc = self.offsets.get(num)
+        if loc is None:
+            return None
+        return self._stream_at(*loc)[1]
+
+    def _stream_at(self, buf, pos):
+        """Return (dictionary, decoded data) of the stream object whose value starts at pos."""
+        d, end = parse_value(buf, pos)
+        if not isinstance(d, dict):
+            return d, None
+        m = STREAM_RE.match(buf, end)
+        if not m:
+            return d, None
+        length = self.resolve(d.get("Length"))
+        start = m.end()
+        if isinstance(length, int) and buf[start + length : start + length + 20].lstrip().startswith(b"endstream"):
+            data = buf[start : start + length]
+        else:
+            stop = buf.find(b"endstream", start)
+            data = buf[start : stop if stop >= 0 else len(buf)]
+        filt = self.resolve(d.get("Filter"))
+        if isinstance(filt, list):
+            filt = filt[0] if len(filt) == 1 else filt
+        if filt is None:
+            return d, bytes(data)
+        if filt in ("FlateDecode", "Fl"):
+            data = zlib.decompressobj().decompress(bytes(data))
+            parms = self.resolve(d.get("DecodeParms"))
+            if isinstance(parms, list):
+                parms = parms[0] if parms else None
+            if isinstance(parms, dict) and isinstance(parms.get("Predictor"), int) and parms["Predictor"] >= 10:
+                data = png_unpredict(data, parms.get("Columns", 1))
+            return d, data
+        return d, None
+
+    # ── document structure ──────────────────────────────────
+    def root(self):
+        """Return the catalog found while indexing, or None."""
+        if self.root_ref is None:
+            return None
+        return self.get(self.root_ref.num)
+
+    def pages(self):
+        """Return the list of page dictionaries, in page-tree order."""
+        pages = []
+        root = self.root()
+        tree = self.resolve(root.get("Pages")) if isinstance(root, dict) else None
+        if isinstance(tree, dict):
+            self._walk(tree, pages, set(), 0)
+        return pages
+
+    def _walk(self, node, pages, seen, depth):
+        kids = self.resolve(node.get("Kids"))
+        if node.get("Type") == "Page" or not isinstance(kids, list):
+            if node.get("Type") != "Pages":
+                pages.append(node)
+            return
+        if depth > MAX_DEPTH:
+            return
+        for kid in kids:
+            if isinstance(kid, Ref):
+                if kid.num in seen:
+                    continue
+                seen.add(kid.num)
+            kid = self.resolve(kid)
+            if isinstance(kid, dict):
+                self._walk(kid, pages, seen, depth + 1)
+
+
+def png_unpredict(data, columns):
+    """Undo PNG row predictors (one byte per sample, as in xref streams)."""
+    if not isinstance(columns, int) or columns < 1:
+        return data
+    out = bytearray()
+    prev = bytearray(columns)
+    for start in range(0, len(data) - columns, columns + 1):
+        kind = data[start]
+        row = bytearray(data[start + 1 : start + 1 + columns])
+        for i in range(len(row)):
+            left = row[i - 1] if i else 0
+            up = prev[i]
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif kind == 2:
+                row[i] = (row[i] + up) & 0xFF
+            elif kind == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xFF
+            elif kind == 4:
+                corner = prev[i - 1] if i else 0
+                p = left + up - corner
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - corner)
+                pred = left if pa <= pb and pa <= pc else up if pb <= pc else corner
+                row[i] = (row[i] + pred) & 0xFF
+        out += row
+        prev = row
+    return bytes(out)
+
+
+# ════════════════════════════════════════════════════════════
+# Tokenizer
+# ════════════════════════════════════════════════════════════
+def _decode_name(raw):
+    if b"#" in raw:
+        raw = NAME_ESCAPE_RE.sub(lambda m: bytes([int(m.group(1), 16)]), raw)
+    return raw.decode("latin-1")
+
+
+def _skip_string(buf, pos):
+    """pos is just past '('; return the position just past the matching ')'."""
+    depth = 1
+    while depth:
+        m = STRING_SPECIAL_RE.search(buf, pos)
+        if not m:
+            return len(buf)
+        c = buf[m.start()]
+        pos = m.end()
+        if c == 0x5C:  # backslash: skip the escaped byte
+            pos += 1
+        elif c == 0x28:
+            depth += 1
+        else:
+            depth -= 1
+    return pos
+
+
+def parse_value(buf, pos, depth=0):
+    """
+    Parse one PDF value starting at pos. Returns (value, end_pos).
+
+    Dictionaries become dicts keyed by name (without the slash), arrays
+    lists, names str, numbers int/float, references Ref. Strings are
+    skipped and returned as None: none of the counters need their contents.
+    """
+    if depth > MAX_DEPTH:
+        raise ValueError("nesting too deep")
+    pos = SKIP_RE.match(buf, pos).end()
+    c = buf[pos : pos + 2]
+
+    if c == b"<<":
+        pos += 2
+        d = {}
+        while True:
+            pos = SKIP_RE.match(buf, pos).end()
+            if buf[pos : pos + 2] == b">>" or pos >= len(buf):
+                return d, pos + 2
+            m = NAME_RE.match(buf, pos)
+            if not m:
+                # malformed key: skip the token and carry on
+                _, pos = parse_value(buf, pos, depth + 1)
+                continue
+            key = _decode_name(m.group(1))
+            d[key], pos = parse_value(buf, m.end(), depth + 1)
+
+    c = c[:1]
+    if c == b"[":
+        pos += 1
+        items = []
+        while True:
+            pos = SKIP_RE.match(buf, pos).end()
+            if buf[pos : pos + 1] == b"]" or pos >= len(buf):
+                return items, pos + 1
+            item, pos = parse_value(buf, pos, depth + 1)
+            items.append(item)
+    if c == b"/":
+        m = NAME_RE.match(buf, pos)
+        return _decode_name(m.group(1)), m.end()
+    if c == b"(":
+        return None, _skip_string(buf, pos + 1)
+    if c == b"<":
+        m = HEXSTR_RE.match(buf, pos)
+        return None, (m.end() if m else pos + 1)
+
+    m = REF_RE.match(buf, pos)
+    if m:
+        return Ref(int(m.group(1)), int(m.group(2))), m.end()
+    m = NUMBER_RE.match(buf, pos)
+    if m:
+        tok = m.group(0)
+        return (float(tok) if b"." in tok else int(tok)), m.end()
+    m = KEYWORD_RE.match(buf, pos)
+    if m:
+        kw = m.group(0)
+        value = {b"true": True, b"false": False}.get(kw)
+        return value, m.end()
+    if pos >= len(buf):
+        raise IndexError("unexpected end of data")
+    # stray delimiter: consume it so parsing always makes progress
+    return None, pos + 1
+
+
+# ════════════════════════════════════════════════════════════
+# Public API
+# ════════════════════════════════════════════════════════════
+def scan_pdf(path):
+    """
+    Return {"pages": n, "objects": n, "subtypes": Counter} for the PDF at
+    path, where subtypes counts the /Subtype of every entry in every page's
+    /Annots array. Unreadable files yield zero counts.
+    """
+    result = {"pages": 0, "objects": 0, "subtypes": Counter()}
+    try:
+        with open(path, "rb") as fh:
+            try:
+                buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                return result
+    except OSError:
+        return result
+
+    with buf:
+        pdf = RawPdf(buf)
+        pages = pdf.pages()
+        result["pages"] = len(pages)
+        result["objects"] = pdf.object_count
+        for page in pages:
+            annots = pdf.resolve(page.get("Annots"))
+            if not isinstance(annots, list):
+                continue
+            for a in annots:
+                a = pdf.resolve(a)
+                if not isinstance(a, dict):
+                    continue
+                subtype = pdf.resolve(a.get("Subtype"))
+                result["subtypes"][subtype if isinstance(subtype, str) else ""] += 1
+        # drop references into the map before it is closed
+        pdf.offsets.clear()
+        pdf.cache.clear()
+    return result
@@ -0,0 +1,117 @@
+"""
+Constant-memory running statistics used by `sum.py --stream`.
+
+P2Quantile is the P² algorithm (Jain & Chlamtac, 1985): it tracks a single
+quantile with five markers whose heights are adjusted with piecewise
+parabolic interpolation, so memory is O(1) regardless of how many values
+are added. LogHistogram keeps counts in logarithmic bins (a fixed number of
+sub-bins per power of two) and is used to estimate how many values fall
+below an arbitrary cut point.
+"""
+
+import math
+
+
+class P2Quantile:
+    """Streaming estimate of the p-quantile of the values added so far."""
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.heights = []
+        self.pos = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.step = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        q = self.heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        n = self.pos
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.step[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = self._parabolic(i, d)
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.pos
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        """Current estimate (exact while fewer than five values were added)."""
+        q = self.heights
+        if not q:
+            return float("nan")
+        if self.count <= 5:
+            return _exact(q, self.p)
+        return q[2]
+
+
+def _exact(sorted_values, p):
+    """p-quantile of a short sorted list (linear interpolation)."""
+    pos = p * (len(sorted_values) - 1)
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+class LogHistogram:
+    """Counts of non-negative values in log2-spaced bins (bins_per_octave each)."""
+
+    def __init__(self, bins_per_octave=16):
+        self.bins_per_octave = bins_per_octave
+        self.counts = {}
+        self.total = 0
+
+    def _bin(self, x):
+        if x < 1:
+            return -1
+        return int(math.log2(x) * self.bins_per_octave)
+
+    def _edges(self, b):
+        if b < 0:
+            return 0.0, 1.0
+        return 2 ** (b / self.bins_per_octave), 2 ** ((b + 1) / self.bins_per_octave)
+
+    def add(self, x):
+        b = self._bin(x)
+        self.counts[b] = self.counts.get(b, 0) + 1
+        self.total += 1
+
+    def count_le(self, x):
+        """Estimated number of values <= x (linear within the bin containing x)."""
+        target = self._bin(x)
+        below = sum(n for b, n in self.counts.items() if b < target)
+        n = self.counts.get(target, 0)
+        if n:
+            lo, hi = self._edges(target)
+            below += n * min(1.0, max(0.0, (x - lo) / (hi - lo)))
+        return below
@@ -1,13 +1,32 @@
 import os
 import sys
+import json
 import fitz
+import random
+import hashlib
 import logging
-import statistics
+import argparse
+import functools
+import itertools
+import resource
+import time
+import multiprocessing
 
-from pdfrw import PdfReader, PdfName
+import numpy as np
+import pandas as pd
+
+from pdfrw import PdfReader
+from collections import Counter
+
+import rawscan
+import streamstats
+from pdf_generation.seedclass import CLASSES, classify, split_subtypes
 
 logging.getLogger("pdfrw").setLevel(logging.CRITICAL)
 
+CACHE_FILE = ".sum_cache.json"
+CACHE_VERSION = 3
+
 
 def human_readable_size(num, suffix="B"):
     """Convert a byte count into a human-readable string."""
@@ -18,171 +37,749 @@ def human_readable_size(num, suffix="B"):
     return f"{num:.1f}Y{suffix}"
 
 
+def new_record(pages=0, objects=0, subtypes=None):
+    """
+    Per-file result shared by all backends: page count, indirect object
+    count, {annotation subtype: count} over every page's /Annots array and
+    the PyMuPDF-style annotation and widget counts derived from it.
+    """
+    subtypes = dict(subtypes or {})
+    annots, widgets = split_subtypes(subtypes)
+    return {
+        "pages": pages,
+        "objects": objects,
+        "annots": annots,
+        "widgets": widgets,
+        "subtypes": subtypes,
+    }
+
+
 def count_objects_mupdf(path):
-    """Return (annotation_count, widget_count) across all pages of a PDF."""
+    """Return the record for a PDF, counting with PyMuPDF across all pages."""
     try:
         doc = fitz.open(path)
     except Exception:
-        return 0, 0
+        return new_record()
     annots = 0
     widgets = 0
+    subtypes = Counter()
     for pno in range(doc.page_count):
         page = doc.load_page(pno)
         annots += len(list(page.annots() or []))
         widgets += len(list(page.widgets() or []))
+        for xref, _, _ in page.annot_xrefs():
+            kind, value = doc.xref_get_key(xref, "Subtype") if xref > 0 else ("", "")
+            subtypes[value[1:] if kind == "name" else ""] += 1
 
+    record = new_record(doc.page_count, max(doc.xref_length() - 1, 0), subtypes)
+    # page.annots()/page.widgets() stay the reference for the two totals
+    record["annots"], record["widgets"] = annots, widgets
     doc.close()
-    return annots, widgets
+    return record
 
 
 def count_objects_pdfrw(path):
-    """Return (annotation_count, widget_count) for the first page of a PDF."""
+    """Return the record for a PDF, counting with pdfrw across all pages."""
     try:
         reader = PdfReader(path)
+        pages = reader.pages
     except Exception:
-        return 0, 0
-    page = reader.pages[0]  # assume one‐page PDFs
-    annots = getattr(page, "Annots", []) or []
-    widget_count = 0
-    for a in annots:
+        return new_record()
+    subtypes = Counter()
+    # pdfrw resolves indirect objects on access, so only the page dicts and
+    # the annotations they reference are ever loaded.
+    for page in pages:
         try:
-            if a.Subtype == PdfName.Widget:
-                widget_count += 1
+            annots = page.Annots or []
         except Exception:
             continue
-    annot_count = len(annots) - widget_count
-    return annot_count, widget_count
+        for a in annots:
+            try:
+                subtypes[str(a.Subtype or "/")[1:]] += 1
+            except Exception:
+                continue
+    objects = len(getattr(reader.source, "obj_offsets", ()))
+    return new_record(len(pages), objects, subtypes)
+
+
+def count_objects_pikepdf(path):
+    """Return the record for a PDF, counting with pikepdf across all pages."""
+    import pikepdf
+
+    subtypes = Counter()
+    try:
+        pdf = pikepdf.open(path)
+    except Exception:
+        return new_record()
+    with pdf:
+        for page in pdf.pages:
+            try:
+                annots = page.obj.get("/Annots") or []
+                for a in annots:
+                    if isinstance(a, pikepdf.Dictionary):
+                        subtypes[str(a.get("/Subtype", "/"))[1:]] += 1
+            except Exception:
+                continue
+        return new_record(len(pdf.pages), len(pdf.objects), subtypes)
+
+
+def count_objects_raw(path):
+    """Return the record for a PDF from its raw bytes, without parsing the document."""
+    scan = rawscan.scan_pdf(path)
+    return new_record(scan["pages"], scan["objects"], scan["subtypes"])
+
+
+# Every backend maps a path to a new_record() using the same rules as
+# PyMuPDF, so their results are directly comparable.
+BACKENDS = {
+    "fitz": count_objects_mupdf,
+    "pdfrw": count_objects_pdfrw,
+    "pikepdf": count_objects_pikepdf,
+    "raw": count_objects_raw,
+}
+
+
+def annot_widget_counts(record):
+    """(annotation_count, widget_count) of a record."""
+    return record["annots"], record["widgets"]
 
 
 # ════════════════════════════════════════════════════════════
-# Main
+# Scanning (parallel workers + per-file result cache)
 # ════════════════════════════════════════════════════════════
-if len(sys.argv) == 1:
-    print("No input directory, exiting.")
-    exit(0)
-
-input_dir = sys.argv[1]
-sizes = []
-
-only_annots = []
-only_widgets = []
-both = []
-neither = []
-
-total_annots = 0
-total_widgets = 0
-
-bucket_counts = {
-    "<10KB": 0,
-    "10-50KB": 0,
-    "50-200KB": 0,
-    "200-500KB": 0,
-    ">500KB": 0,
-}
+def file_digest(path):
+    """Return (path, sha1 hex digest) of the file contents."""
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return path, h.hexdigest()
+
+
+def scan_file(path, backend="fitz"):
+    """Worker entry point: return (path, record)."""
+    return path, BACKENDS[backend](path)
+
+
+def load_cache(cache_path):
+    """
+    Load the result cache:
+    {abs_path: {size, mtime_ns, sha1, counts: {backend: record}}}.
+    A missing, unreadable or out-of-date cache is treated as empty.
+    """
+    if not cache_path or not os.path.isfile(cache_path):
+        return {}
+    try:
+        with open(cache_path) as fh:
+            data = json.load(fh)
+    except (IOError, ValueError):
+        return {}
+    if data.get("version") != CACHE_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def save_cache(cache_path, entries):
+    """Atomically write the result cache."""
+    if not cache_path:
+        return
+    tmp = cache_path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump({"version": CACHE_VERSION, "files": entries}, fh)
+    os.replace(tmp, cache_path)
+
+
+def list_pdfs(input_dir):
+    """Return the sorted list of *.pdf file names in input_dir."""
+    return [f for f in sorted(os.listdir(input_dir)) if f.lower().endswith(".pdf")]
+
+
+def scan_directory(input_dir, backend="fitz", workers=1, chunksize=None, cache_path=None):
+    """
+    Scan every PDF in input_dir with the given backend.
 
-print("File statistics:\n")
-for fname in sorted(os.listdir(input_dir)):
-    if not fname.lower().endswith(".pdf"):
-        continue
-    path = os.path.join(input_dir, fname)
-
-    a_count, w_count = count_objects_mupdf(path)
-    size_bytes = os.path.getsize(path)
-    sizes.append(size_bytes)
-    size_hr = human_readable_size(size_bytes)
-
-    total_annots += a_count
-    total_widgets += w_count
-
-    # classify
-    if a_count > 0 and w_count == 0:
-        only_annots.append(fname)
-    elif w_count > 0 and a_count == 0:
-        only_widgets.append(fname)
-    elif w_count > 0 and a_count > 0:
-        both.append(fname)
+    Files whose (path, size, mtime) match the cache are not touched at all;
+    files that changed on disk are hashed first and only re-opened if their
+    content hash is unknown. The remaining files are distributed over a
+    process pool in chunks.
+
+    Returns one dict per file, sorted by fname: the backend's record plus
+    fname, size and sha1.
+    """
+    cache = load_cache(cache_path)
+    by_digest = {e["sha1"]: e for e in cache.values()}
+
+    stats = {}
+    for fname in list_pdfs(input_dir):
+        path = os.path.abspath(os.path.join(input_dir, fname))
+        st = os.stat(path)
+        stats[path] = (fname, st.st_size, st.st_mtime_ns)
+
+    results = {}
+    digests = {}
+    stale = []
+    to_open = []
+    for path, (_, size, mtime) in stats.items():
+        entry = cache.get(path)
+        if entry and entry["size"] == size and entry["mtime_ns"] == mtime:
+            results[path] = entry
+            digests[path] = entry["sha1"]
+            if backend not in entry["counts"]:
+                to_open.append(path)
+        else:
+            stale.append(path)
+
+    pool = None
+    if workers > 1 and (stale or to_open):
+        pool = multiprocessing.Pool(workers)
+
+    def run(func, items):
+        """Map func over items, in chunks across the pool when there is one."""
+        if not pool:
+            return map(func, items)
+        n = chunksize or max(1, len(items) // (workers * 4))
+        return pool.imap_unordered(func, items, chunksize=n)
+
+    reopened = len(to_open)
+    reused = 0
+    try:
+        # Changed (size, mtime) but possibly identical contents: hash only.
+        for path, digest in run(file_digest, stale):
+            digests[path] = digest
+            known = by_digest.get(digest)
+            results[path] = {"counts": dict(known["counts"]) if known else {}}
+            if backend in results[path]["counts"]:
+                reused += 1
+            else:
+                to_open.append(path)
+
+        worker = functools.partial(scan_file, backend=backend)
+        for path, record in run(worker, to_open):
+            results[path]["counts"][backend] = record
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    for path, (_, size, mtime) in stats.items():
+        results[path].update(size=size, mtime_ns=mtime, sha1=digests[path])
+
+    if cache_path:
+        # Drop entries for files that were removed from this directory.
+        root = os.path.abspath(input_dir) + os.sep
+        cache = {
+            p: e for p, e in cache.items()
+            if not (p.startswith(root) and os.sep not in p[len(root):])
+        }
+        cache.update(results)
+        save_cache(cache_path, cache)
+
+    print(
+        f"Scanned {len(stats)} PDFs with {backend}: "
+        f"{len(stats) - len(stale) - reopened} cached, "
+        f"{reused} unchanged content, {len(to_open)} opened",
+        file=sys.stderr,
+    )
+    return [
+        dict(results[path]["counts"][backend], fname=fname, size=size, sha1=digests[path])
+        for path, (fname, size, _) in stats.items()
+    ]
+
+
+def compare_backends(input_dir, sample, backend="raw", reference="fitz", seed=0):
+    """
+    Run `backend` and `reference` on a random sample of the PDFs in input_dir
+    and report how often their (annots, widgets) counts disagree.
+    """
+    names = list_pdfs(input_dir)
+    rng = random.Random(seed)
+    picked = sorted(rng.sample(names, min(sample, len(names))))
+
+    mismatches = []
+    for fname in picked:
+        path = os.path.join(input_dir, fname)
+        got = annot_widget_counts(BACKENDS[backend](path))
+        want = annot_widget_counts(BACKENDS[reference](path))
+        if got != want:
+            mismatches.append((fname, want, got))
+
+    print("\n═══════════════════════════════════════════")
+    print(f"Backend agreement ({backend} vs {reference}):")
+    print("───────────────────────────────────────────")
+    print(f"  Sampled files : {len(picked)}")
+    print(f"  Disagreements : {len(mismatches)}", end="")
+    if picked:
+        print(f" ({len(mismatches) / len(picked) * 100:.1f}%)")
     else:
-        neither.append(fname)
-
-    # bucket
-    if size_bytes < 10 * 1024:
-        bucket_counts["<10KB"] += 1
-    elif size_bytes < 50 * 1024:
-        bucket_counts["10-50KB"] += 1
-    elif size_bytes < 200 * 1024:
-        bucket_counts["50-200KB"] += 1
-    elif size_bytes < 500 * 1024:
-        bucket_counts["200-500KB"] += 1
+        print()
+    for fname, want, got in mismatches:
+        print(f"  {fname}: {reference}={want[0]}/{want[1]} {backend}={got[0]}/{got[1]}")
+
+
+def benchmark_backend(backend, paths):
+    """
+    Run one backend over paths in the current (fresh) process.
+    Returns (elapsed_seconds, peak_rss_growth_kb, [counts per path]); the
+    growth is measured from the process's peak RSS before the run, so the
+    memory it inherited from the parent is not counted.
+    """
+    base_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    results = [annot_widget_counts(BACKENDS[backend](p)) for p in paths]
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return elapsed, peak_kb - base_kb, results
+
+
+def benchmark_backends(input_dir, backends, sample=0, reference="fitz", seed=0):
+    """
+    Time every backend over the corpus (or a random sample of it), each in its
+    own child process so the peak RSS growth is measured per backend, and
+    report how often each one agrees with the reference backend.
+    """
+    names = list_pdfs(input_dir)
+    if sample:
+        names = sorted(random.Random(seed).sample(names, min(sample, len(names))))
+    paths = [os.path.join(input_dir, f) for f in names]
+
+    runs = {}
+    for backend in backends:
+        with multiprocessing.Pool(1) as pool:
+            runs[backend] = pool.apply(benchmark_backend, (backend, paths))
+        print(f"  benchmarked {backend}", file=sys.stderr)
+
+    ref_counts = runs[reference][2] if reference in runs else None
+    print("\n═══════════════════════════════════════════")
+    if ref_counts is None:
+        print(f"Backend benchmark ({len(paths)} PDFs; {reference} was not benchmarked, so no agreement):")
     else:
-        bucket_counts[">500KB"] += 1
-
-    # print(f"{fname}: {a_count:3d} annotations, {w_count:3d} widgets, {size_hr}")
-
-# per‐file done
-print("\n═══════════════════════════════════════════")
-print("PDF classification summary:")
-print("───────────────────────────────────────────")
-print(f"PDF count                       : {len(sizes)}")
-print(f"Only annotations                : {len(only_annots)}")
-print(f"Only widgets                    : {len(only_widgets)}")
-print(f"Both annots+widgets             : {len(both)}")
-print(f"Neither annotations nor widgets : {len(neither)}")
-
-# size summary
-if sizes:
+        print(f"Backend benchmark ({len(paths)} PDFs, agreement vs {reference}):")
+    print("───────────────────────────────────────────")
+    print(f"  {'Backend':10s} {'Files/s':>10s} {'RSS growth':>10s} {'Agreement':>10s}")
+    for backend in backends:
+        elapsed, peak_kb, results = runs[backend]
+        rate = len(paths) / elapsed if elapsed else float("inf")
+        if ref_counts is None or not paths:
+            agree = "n/a"
+        else:
+            same = sum(1 for a, b in zip(results, ref_counts) if a == b)
+            agree = f"{same / len(paths) * 100:.1f}%"
+        rss = human_readable_size(peak_kb * 1024)
+        print(f"  {backend:10s} {rate:10.1f} {rss:>10s} {agree:>10s}")
+
+
+# ════════════════════════════════════════════════════════════
+# Streaming mode (constant memory)
+# ════════════════════════════════════════════════════════════
+class StreamingSummary:
+    """Running counters plus P² quartile sketches; memory does not grow with the corpus."""
+
+    def __init__(self):
+        self.count = 0
+        self.classes = dict.fromkeys(CLASSES, 0)
+        self.annots = 0
+        self.widgets = 0
+        self.total_size = 0
+        self.min = None
+        self.max = None
+        self.sketches = [streamstats.P2Quantile(p) for p in (0.25, 0.5, 0.75)]
+        self.histogram = streamstats.LogHistogram()
+
+    def add(self, size_bytes, a_count, w_count):
+        self.count += 1
+        self.classes[classify(a_count, w_count)] += 1
+        self.annots += a_count
+        self.widgets += w_count
+        self.total_size += size_bytes
+        self.min = size_bytes if self.min is None else min(self.min, size_bytes)
+        self.max = size_bytes if self.max is None else max(self.max, size_bytes)
+        for sketch in self.sketches:
+            sketch.add(size_bytes)
+        self.histogram.add(size_bytes)
+
+    def quartiles(self):
+        return tuple(s.value() for s in self.sketches)
+
+    def summary(self):
+        """Summary numbers for print_summary(); quartile buckets are estimates."""
+        summary = {
+            "count": self.count,
+            "classes": dict(self.classes),
+            "annots": self.annots,
+            "widgets": self.widgets,
+            "neither": None,
+            "estimated": True,
+        }
+        if self.count:
+            q = self.quartiles()
+            below = [round(self.histogram.count_le(c)) for c in q]
+            summary.update(
+                min=self.min,
+                max=self.max,
+                mean=self.total_size / self.count,
+                quartiles=q,
+                quartile_counts=[
+                    below[0],
+                    below[1] - below[0],
+                    below[2] - below[1],
+                    self.count - below[2],
+                ],
+            )
+        return summary
+
+    def progress_line(self):
+        q = " / ".join(human_readable_size(v) for v in self.quartiles())
+        c = self.classes
+        return (
+            f"[{self.count} PDFs] quartiles {q} | annots {self.annots} "
+            f"widgets {self.widgets} | only-a {c['only_annots']} "
+            f"only-w {c['only_widgets']} both {c['both']} neither {c['neither']}"
+        )
+
+
+def iter_pdf_paths(input_dir):
+    """Yield the paths of *.pdf files in input_dir without listing it up front."""
+    with os.scandir(input_dir) as it:
+        for entry in it:
+            if entry.name.lower().endswith(".pdf") and entry.is_file():
+                yield entry.path
+
+
+def stream_scan_file(path, backend="fitz"):
+    """Worker entry point for --stream: return (size_bytes, annots, widgets)."""
+    return (os.path.getsize(path),) + annot_widget_counts(BACKENDS[backend](path))
+
+
+def stream_directory(input_dir, backend="fitz", workers=1, chunksize=None, every=10.0):
+    """
+    Scan input_dir with bounded memory: files are enumerated lazily, handed
+    to the pool in fixed-size batches, and folded into a StreamingSummary.
+    A progress line with the live quartiles and totals goes to stderr every
+    `every` seconds.
+    """
+    summary = StreamingSummary()
+    worker = functools.partial(stream_scan_file, backend=backend)
+    chunksize = chunksize or 16
+    paths = iter_pdf_paths(input_dir)
+    last = time.monotonic()
+
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        while True:
+            batch = list(itertools.islice(paths, workers * chunksize * 8))
+            if not batch:
+                break
+            if pool:
+                results = pool.imap_unordered(worker, batch, chunksize=chunksize)
+            else:
+                results = map(worker, batch)
+            for size_bytes, a_count, w_count in results:
+                summary.add(size_bytes, a_count, w_count)
+                if every and time.monotonic() - last >= every:
+                    print(summary.progress_line(), file=sys.stderr, flush=True)
+                    last = time.monotonic()
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    print(summary.progress_line(), file=sys.stderr)
+    return summary
+
+
+# ════════════════════════════════════════════════════════════
+# Per-seed manifest
+# ════════════════════════════════════════════════════════════
+MANIFEST_COLUMNS = ["fname", "size", "pages", "objects", "annots", "widgets", "class", "sha1"]
+SUBTYPE_PREFIX = "subtype_"
+
+
+def build_manifest(rows):
+    """
+    Build the per-seed feature table from scan_directory() rows: the fixed
+    MANIFEST_COLUMNS plus one integer subtype_<Name> column per annotation
+    subtype seen anywhere in the corpus.
+    """
+    records = []
+    for r in rows:
+        rec = {c: r[c] for c in MANIFEST_COLUMNS if c != "class"}
+        rec["class"] = classify(r["annots"], r["widgets"])
+        for subtype, n in r["subtypes"].items():
+            rec[SUBTYPE_PREFIX + (subtype or "None")] = n
+        records.append(rec)
+
+    df = pd.DataFrame.from_records(records)
+    if df.empty:
+        df = pd.DataFrame(columns=MANIFEST_COLUMNS)
+    subtype_cols = sorted(c for c in df.columns if c.startswith(SUBTYPE_PREFIX))
+    df[subtype_cols] = df[subtype_cols].fillna(0).astype("int64")
+    df["class"] = pd.Categorical(df["class"], categories=list(CLASSES))
+    return df[MANIFEST_COLUMNS + subtype_cols]
+
+
+def write_manifest(df, path):
+    """Write the manifest in the format given by the file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        df.to_parquet(path, index=False)
+    elif ext in (".feather", ".arrow"):
+        df.to_feather(path)
+    elif ext == ".csv":
+        df.to_csv(path, index=False)
+    else:
+        raise ValueError(f"unsupported manifest format: {path}")
+
+
+def read_manifest(path):
+    """Read a manifest written by write_manifest()."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        return pd.read_parquet(path)
+    if ext in (".feather", ".arrow"):
+        return pd.read_feather(path)
+    if ext == ".csv":
+        return pd.read_csv(path)
+    raise ValueError(f"unsupported manifest format: {path}")
+
+
+def quartiles(values):
+    """
+    The three cut points of statistics.quantiles(values, n=4) (default
+    "exclusive" method), computed with numpy on the whole column at once.
+    """
+    data = np.sort(np.asarray(values, dtype=float))
+    if len(data) == 1:
+        return data[0], data[0], data[0]
+    m, n = len(data) + 1, 4
+    i = np.arange(1, n)
+    j = np.clip(i * m // n, 1, len(data) - 1)
+    delta = i * m - j * n
+    return tuple((data[j - 1] * (n - delta) + data[j] * delta) / n)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(
+        description="Summarize annotation/widget classes and sizes of a PDF corpus."
+    )
+    p.add_argument("input_dir", nargs="?", help="directory containing the PDFs")
+    p.add_argument(
+        "--backend",
+        choices=sorted(BACKENDS),
+        default="fitz",
+        help="how to count annotations/widgets: full PyMuPDF parse (fitz, default), "
+        "pdfrw, pikepdf, or raw-byte scan of the page /Annots arrays (raw)",
+    )
+    p.add_argument(
+        "--compare-sample",
+        type=int,
+        metavar="N",
+        default=0,
+        help="also run the fitz backend on N random files and report disagreements "
+        "(with --benchmark-backends: benchmark on N random files only)",
+    )
+    p.add_argument(
+        "--benchmark-backends",
+        nargs="?",
+        const=",".join(sorted(BACKENDS)),
+        metavar="LIST",
+        help="report files/s, peak RSS growth and agreement with fitz for each backend "
+        "(comma separated, default: all) and exit",
+    )
+    p.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=1,
+        help="number of worker processes (0 = one per CPU, default: 1)",
+    )
+    p.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="files handed to a worker at a time (default: auto)",
+    )
+    p.add_argument(
+        "--cache",
+        default=CACHE_FILE,
+        help=f"per-file result cache (default: {CACHE_FILE})",
+    )
+    p.add_argument(
+        "--no-cache", action="store_true", help="neither read nor write the cache"
+    )
+    p.add_argument(
+        "--stream",
+        action="store_true",
+        help="constant-memory mode for huge directories: running counters and "
+        "estimated quartiles, no cache, manifest or per-file lists",
+    )
+    p.add_argument(
+        "--progress-every",
+        type=float,
+        default=10.0,
+        metavar="SECONDS",
+        help="with --stream, print live quartiles and totals this often (0 = never)",
+    )
+    p.add_argument(
+        "--manifest",
+        help="per-seed feature table to write after a scan, or to read with --query "
+        "when no input directory is given (.parquet, .feather/.arrow or .csv)",
+    )
+    p.add_argument(
+        "--query",
+        metavar="EXPR",
+        help='pandas query over the manifest, e.g. "size < 3072 and widgets > 0 '
+        'and subtype_FreeText > 0"; prints the matching seeds',
+    )
+    return p.parse_args()
+
+
+def summarize_manifest(df):
+    """Summary numbers for print_summary(), computed column-wise over a manifest."""
+    sizes = df["size"].to_numpy()
+    by_class = df["class"].value_counts()
+    summary = {
+        "count": len(sizes),
+        "classes": {key: int(by_class.get(key, 0)) for key in CLASSES},
+        "annots": int(df["annots"].sum()),
+        "widgets": int(df["widgets"].sum()),
+        "neither": list(df.loc[df["class"] == "neither", "fname"]),
+        "estimated": False,
+    }
+    if len(sizes):
+        q1, q2, q3 = quartiles(sizes)
+        summary.update(
+            min=sizes.min(),
+            max=sizes.max(),
+            mean=sizes.mean(),
+            quartiles=(q1, q2, q3),
+            quartile_counts=[
+                int((sizes <= q1).sum()),
+                int(((q1 < sizes) & (sizes <= q2)).sum()),
+                int(((q2 < sizes) & (sizes <= q3)).sum()),
+                int((sizes > q3).sum()),
+            ],
+        )
+    return summary
+
+
+def print_summary(summary, input_dir):
+    """Print the classification, size and totals tables."""
     print("\n═══════════════════════════════════════════")
-    print("File size summary:")
+    print("PDF classification summary:")
     print("───────────────────────────────────────────")
-    print(f"  Smallest file: {human_readable_size(min(sizes))}")
-    print(f"  Largest  file: {human_readable_size(max(sizes))}")
-    print(f"  Average size : {human_readable_size(sum(sizes) / len(sizes))}")
-
-# bucket distribution
-if sizes:
-    # Compute quartiles (three cut-points dividing data into four equal groups)
-    q1, q2, q3 = statistics.quantiles(sizes, n=4)
-    # Build dynamic buckets
-    dynamic_buckets = [
-        (f"≤{human_readable_size(q1)}", lambda s: s <= q1),
-        (
+    print(f"PDF count                       : {summary['count']}")
+    for key, label in CLASSES.items():
+        print(f"{label:32s}: {summary['classes'][key]}")
+
+    # size summary
+    if summary["count"]:
+        print("\n═══════════════════════════════════════════")
+        print("File size summary:")
+        print("───────────────────────────────────────────")
+        print(f"  Smallest file: {human_readable_size(summary['min'])}")
+        print(f"  Largest  file: {human_readable_size(summary['max'])}")
+        print(f"  Average size : {human_readable_size(summary['mean'])}")
+
+    # bucket distribution
+    if summary["count"]:
+        # three cut-points dividing data into four equal groups
+        q1, q2, q3 = summary["quartiles"]
+        labels = [
+            f"≤{human_readable_size(q1)}",
             f"{human_readable_size(q1)}–{human_readable_size(q2)}",
-            lambda s: q1 < s <= q2,
-        ),
-        (
             f"{human_readable_size(q2)}–{human_readable_size(q3)}",
-            lambda s: q2 < s <= q3,
-        ),
-        (f">{human_readable_size(q3)}", lambda s: s > q3),
-    ]
-    # Initialize counts
-    bucket_counts = {label: 0 for label, _ in dynamic_buckets}
-
-    # Tally
-    for s in sizes:
-        for label, test in dynamic_buckets:
-            if test(s):
-                bucket_counts[label] += 1
-                break
+            f">{human_readable_size(q3)}",
+        ]
+
+        # Print dynamic distribution
+        print("\n═══════════════════════════════════════════")
+        if summary["estimated"]:
+            print("Size distribution (estimated quartiles):")
+        else:
+            print("Size distribution (dynamic quartiles):")
+        print("───────────────────────────────────────────")
+        for label, n in zip(labels, summary["quartile_counts"]):
+            print(f"  {label:15s}: {n}")
 
-    # Print dynamic distribution
+    # total counts
     print("\n═══════════════════════════════════════════")
-    print("Size distribution (dynamic quartiles):")
+    print("Total objects across all PDFs:")
     print("───────────────────────────────────────────")
-    for label, _ in dynamic_buckets:
-        print(f"  {label:15s}: {bucket_counts[label]}")
-
-# total counts
-print("\n═══════════════════════════════════════════")
-print("Total objects across all PDFs:")
-print("───────────────────────────────────────────")
-print(f"  Total annotations = {total_annots}")
-print(f"  Total widgets     = {total_widgets}")
-
-if neither:
-    # Build full paths
-    paths = [os.path.join(input_dir, f) for f in neither]
-    # Print the rm command
-    print("\nTo delete all PDFs without any annotations or widgets, run:")
-    print("rm " + " ".join(f"'{p}'" for p in paths))
-else:
-    print("\nNo “neither” PDFs to remove.")
+    print(f"  Total annotations = {summary['annots']}")
+    print(f"  Total widgets     = {summary['widgets']}")
+
+    neither = summary["neither"]
+    if neither is None:
+        n = summary["classes"]["neither"]
+        print(f"\n{n} “neither” PDFs (file names are not kept in --stream mode).")
+    elif neither:
+        # Build full paths
+        paths = [os.path.join(input_dir, f) for f in neither]
+        # Print the rm command
+        print("\nTo delete all PDFs without any annotations or widgets, run:")
+        print("rm " + " ".join(f"'{p}'" for p in paths))
+    else:
+        print("\nNo “neither” PDFs to remove.")
+
+
+def print_query(df, expr):
+    """Print the seeds of the manifest matching a pandas query expression."""
+    hits = df.query(expr)
+    print("\n═══════════════════════════════════════════")
+    print(f"Query: {expr}")
+    print("───────────────────────────────────────────")
+    if len(hits):
+        cols = ["fname", "size", "pages", "annots", "widgets", "class"]
+        print(hits[cols].to_string(index=False))
+    print(f"\n{len(hits)} of {len(df)} seeds match")
+
+
+# ════════════════════════════════════════════════════════════
+# Main
+# ════════════════════════════════════════════════════════════
+def main():
+    args = parse_args()
+    if not args.input_dir and args.query and args.manifest:
+        print_query(read_manifest(args.manifest), args.query)
+        return
+    if not args.input_dir:
+        print("No input directory, exiting.")
+        exit(0)
+
+    input_dir = args.input_dir
+    if args.benchmark_backends:
+        backends = [b.strip() for b in args.benchmark_backends.split(",") if b.strip()]
+        unknown = [b for b in backends if b not in BACKENDS]
+        if unknown:
+            print(f"Unknown backend(s): {', '.join(unknown)}", file=sys.stderr)
+            exit(2)
+        benchmark_backends(input_dir, backends, args.compare_sample)
+        return
+
+    workers = args.workers or os.cpu_count() or 1
+    cache_path = None if args.no_cache else args.cache
+
+    print("File statistics:\n")
+    if args.stream:
+        summary = stream_directory(
+            input_dir, args.backend, workers, args.chunksize, args.progress_every
+        )
+        print_summary(summary.summary(), input_dir)
+        return
+
+    rows = scan_directory(input_dir, args.backend, workers, args.chunksize, cache_path)
+    df = build_manifest(rows)
+    if args.manifest:
+        write_manifest(df, args.manifest)
+        print(f"Wrote manifest with {len(df)} rows to {args.manifest}", file=sys.stderr)
+
+    print_summary(summarize_manifest(df), input_dir)
+
+    if args.compare_sample:
+        compare_backends(input_dir, args.compare_sample, backend=args.backend)
+    if args.query:
+        print_query(df, args.query)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the scripts are run from their own directories, not installed
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for sub in ("coverage_analysis", "pdf_generation"):
+    sys.path.insert(0, os.path.join(ROOT, sub))
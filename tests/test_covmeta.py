@@ -0,0 +1,45 @@
+import os
+
+import covmeta
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "covmeta")
+FUNCS = covmeta.load_functions(os.path.join(DATA, "functions.csv"))
+HTML_REPORT = os.path.join(DATA, "report")
+JSON_REPORT = os.path.join(DATA, "export.json")
+
+
+def test_json_report_lines_match_html_parser():
+    html_file = os.path.join(HTML_REPORT, FUNCS[0][0] + ".html")
+    html_lines, _, _ = covmeta.function_lines(covmeta.load_line_table(html_file), FUNCS[0][1])
+    json_lines = covmeta.json_report_lines(JSON_REPORT, FUNCS)
+
+    assert list(json_lines) == [0]
+    assert sorted(json_lines[0]) == [ln for ln, _ in html_lines]
+    assert {ln for ln, count in json_lines[0].items() if count} == {ln for ln, hit in html_lines if hit}
+
+
+def test_json_and_html_reports_agree():
+    assert covmeta.covered_lines(JSON_REPORT, FUNCS) == covmeta.covered_lines(HTML_REPORT, FUNCS)
+    json_stats = covmeta.extract_json_report(JSON_REPORT, FUNCS)
+    html_stats = covmeta.extract_report(HTML_REPORT, FUNCS)
+    # (total, covered); the HTML line range also includes the opening brace
+    assert json_stats[0][:2] == html_stats[0][:2] == (6, 5)
+
+
+def test_series_reuses_pages_that_only_differ_in_timestamp(tmp_path, capsys):
+    rel = FUNCS[0][0] + ".html"
+    with open(os.path.join(HTML_REPORT, rel)) as fh:
+        page = fh.read()
+    assert "Created: 2025-01-01 00:00" in page
+    snapshots = []
+    for n, stamp in enumerate(["2025-01-01 00:00", "2025-01-01 00:10"]):
+        html_file = tmp_path / f"snap{n}" / rel
+        html_file.parent.mkdir(parents=True)
+        html_file.write_text(page.replace("2025-01-01 00:00", stamp))
+        snapshots.append(str(tmp_path / f"snap{n}"))
+
+    series, changed = covmeta.extract_series(snapshots, FUNCS)
+
+    assert changed == [1, 0]
+    assert series[0] == series[1] == covmeta.extract_report(HTML_REPORT, FUNCS)
+    assert "Parsed 1 of 2 report files" in capsys.readouterr().err
@@ -0,0 +1,46 @@
+import io
+import os
+
+from pdfrw import PdfArray, PdfDict, PdfName, PdfReader, PdfWriter
+
+from pdfbytes import pdfrw_page_trailer, write_pdfrw
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "bake_fuzzer_seed_corpus")
+
+
+def fresh_page(path):
+    """A new page holding the annotations of a file's first page, as pook.py builds its seeds."""
+    source = PdfReader(path).pages[0]
+    return PdfDict(
+        Type=PdfName.Page,
+        MediaBox=source.MediaBox,
+        CropBox=source.CropBox or source.MediaBox,
+        Resources=PdfDict(),
+        Contents=PdfArray(),
+        Annots=PdfArray(source.Annots),
+    )
+
+
+def corpus_sample(count=20):
+    """Paths of the first corpus files that pdfrw reads and whose first page has annotations."""
+    found = []
+    for name in sorted(os.listdir(CORPUS)):
+        path = os.path.join(CORPUS, name)
+        try:
+            if PdfReader(path).pages[0].Annots:
+                found.append(path)
+        except Exception:
+            continue
+        if len(found) == count:
+            break
+    return found
+
+
+def test_write_pdfrw_matches_pdfwriter():
+    sample = corpus_sample()
+    assert sample
+    for path in sample:
+        # each side gets its own object graph: writing renumbers and reparents it
+        out = io.BytesIO()
+        PdfWriter().addpage(fresh_page(path)).write(out)
+        assert write_pdfrw(pdfrw_page_trailer(fresh_page(path))) == out.getvalue(), path